@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from pages_app import lob
+
+ATIVIDADES = ["ESTRUTURA", "ALVENARIA", "INSTALACOES", "REBOCO", "CONTRAPISO", "GESSO", "PINTURA", "PISO", "ESQUADRIAS", "LIMPEZA"]
+
+def gerar_cronograma(pavimentos, atividades, seed=42):
+    # Torre com pavimentos sobrepostos no tempo: cada pavimento comeca alguns dias depois do de baixo
+    rnd = random.Random(seed)
+    inicio_obra = datetime(2025, 1, 6)
+    por_pav = max(1, atividades // pavimentos)
+    rows = []
+    for p in range(pavimentos):
+        base = inicio_obra + timedelta(days=7 * p)
+        for a in range(por_pav):
+            ini = base + timedelta(days=rnd.randint(0, 180))
+            fim = ini + timedelta(days=rnd.randint(3, 30))
+            rows.append({
+                "id": len(rows) + 1,
+                "pavimento": f"PAV {p + 1:02d}",
+                "ordem_pav": p + 1,
+                "atividade_nome": ATIVIDADES[a % len(ATIVIDADES)],
+                "data_inicio": ini.strftime("%Y-%m-%d"),
+                "data_fim": fim.strftime("%Y-%m-%d"),
+            })
+    return pd.DataFrame(rows)
+
+def cronometrar(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = fn()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos), resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de montagem do Gantt/LOB (sem Streamlit).")
+    parser.add_argument("--pavimentos", type=int, default=60)
+    parser.add_argument("--atividades", type=int, default=3000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    df = gerar_cronograma(args.pavimentos, args.atividades)
+    print(f"{len(df)} atividades em {args.pavimentos} pavimentos, mediana de {args.repeticoes} execucoes")
+
+    ms, (html, _) = cronometrar(lambda: lob.montar_html_lob(df), args.repeticoes)
+    print(f"{ms:9.1f} ms  montar_html_lob ({len(html) / 1024:.0f} KiB de HTML)")
+
+    meio = pd.to_datetime(df["data_inicio"]).median()
+    janela = lob.janela_em_torno(meio)
+    ms, (html, _) = cronometrar(lambda: lob.montar_html_lob(df, janela=janela), args.repeticoes)
+    print(f"{ms:9.1f} ms  montar_html_lob com janela de +-{lob.JANELA_MESES_PADRAO} meses ({len(html) / 1024:.0f} KiB de HTML)")
+
+    ms, indice = cronometrar(lambda: lob.construir_indice_lob(df), args.repeticoes)
+    print(f"{ms:9.1f} ms  construir_indice_lob")
+    ms, visiveis = cronometrar(lambda: lob.consultar_indice_lob(indice, janela), args.repeticoes)
+    print(f"{ms:9.1f} ms  consultar_indice_lob na janela ({len(visiveis)} atividades)")
+    ms, (html, _) = cronometrar(lambda: lob.montar_html_lob(visiveis, janela=janela), args.repeticoes)
+    print(f"{ms:9.1f} ms  montar_html_lob sobre a consulta do indice")
+
+    ms, fig = cronometrar(lambda: lob.figura_lob(indice["df"], janela), args.repeticoes)
+    segmentos = sum(len(tr.x) // 3 for tr in fig.data if tr.mode == "lines")
+    print(f"{ms:9.1f} ms  figura_lob ({len(fig.data)} traces, {segmentos} barras)")
+
+    ordenado = df.sort_values("data_inicio")
+    inicios, fins = ordenado["data_inicio"].tolist(), ordenado["data_fim"].tolist()
+    ms, (_, faixas) = cronometrar(lambda: lob.alocar_faixas(inicios, fins), args.repeticoes)
+    print(f"{ms:9.1f} ms  alocar_faixas em uma linha so ({len(inicios)} atividades, {faixas} faixas)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,22 @@
 import streamlit as st
 from supabase import create_client, Client
-import pandas as pd
+import os
+import time
+import math
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+
+def _get_secret(nome):
+    # Fora do Streamlit (CLI, processos de relatorio) as credenciais podem vir do ambiente
+    try:
+        return st.secrets[nome]
+    except Exception:
+        return os.environ[nome]
 
 @st.cache_resource
 def get_db_client() -> Client:
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
+    url = _get_secret("SUPABASE_URL")
+    key = _get_secret("SUPABASE_KEY")
     return create_client(url, key)
 
 def check_credentials(username, password):
@@ -21,6 +32,7 @@ def check_credentials(username, password):
         return None
 
 def get_obras_list(role, user_obra_id=None):
+    import pandas as pd
     supabase = get_db_client()
     query = supabase.table("pcp_obras").select("id, nome")
     
@@ -31,6 +43,7 @@ def get_obras_list(role, user_obra_id=None):
     return pd.DataFrame(response.data)
 
 def fetch_indicadores_historicos(obra_id):
+    import pandas as pd
     supabase = get_db_client()
     response = supabase.table("pcp_historico_indicadores")\
         .select("*")\
@@ -38,4 +51,243 @@ def fetch_indicadores_historicos(obra_id):
         .order("data_referencia", desc=False)\
         .execute()
     
-    return pd.DataFrame(response.data)
\ No newline at end of file
+    return pd.DataFrame(response.data)
+
+REF_CACHE_TTL = 600
+REF_CACHE_MAX_ENTRIES = 256
+
+@st.cache_data(ttl=REF_CACHE_TTL, max_entries=REF_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_locais(obra_id):
+    supabase = get_db_client()
+    response = supabase.table("pcp_locais").select("*").eq("obra_id", obra_id).order("ordem").execute()
+    return response.data or []
+
+@st.cache_data(ttl=REF_CACHE_TTL, max_entries=REF_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_atividades_padrao():
+    supabase = get_db_client()
+    response = supabase.table("pcp_atividades_padrao").select("*").order("atividade").execute()
+    return response.data or []
+
+@st.cache_data(ttl=REF_CACHE_TTL, max_entries=REF_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_lista_problemas():
+    supabase = get_db_client()
+    response = supabase.table("pcp_lista_problemas").select("*").execute()
+    return response.data or []
+
+def clear_reference_cache(table=None):
+    caches = {
+        "pcp_locais": get_locais,
+        "pcp_atividades_padrao": get_atividades_padrao,
+        "pcp_lista_problemas": get_lista_problemas,
+    }
+    if table is None:
+        for fn in caches.values():
+            fn.clear()
+    elif table in caches:
+        caches[table].clear()
+
+def begin_run():
+    st.session_state['_query_memo'] = {}
+    st.session_state['_query_memo_hits'] = 0
+
+def _contar_hit():
+    st.session_state['_query_memo_hits'] += 1
+    st.session_state['_query_memo_hits_total'] = st.session_state.get('_query_memo_hits_total', 0) + 1
+
+def _query_fingerprint(query):
+    # postgrest-py guarda metodo, path, params e headers em query.request (RequestConfig)
+    req = query.request
+    metodo = getattr(req.http_method, "value", req.http_method)
+    params = req.params
+    if hasattr(params, "multi_items"):
+        params = tuple(sorted(params.multi_items()))
+    else:
+        params = str(params)
+    headers = req.headers or {}
+    return (
+        str(metodo).upper(),
+        str(req.path),
+        params,
+        headers.get("Accept", ""),
+        headers.get("Prefer", ""),
+    )
+
+def _memoizavel(chave):
+    return chave[0] in ("GET", "HEAD")
+
+def run_query(query):
+    if '_query_memo' not in st.session_state:
+        begin_run()
+    memo = st.session_state['_query_memo']
+
+    key = _query_fingerprint(query)
+    if not _memoizavel(key):
+        memo.clear()
+        return query.execute()
+
+    if key in memo:
+        _contar_hit()
+        return memo[key]
+
+    response = query.execute()
+    memo[key] = response
+    return response
+
+def get_query_memo_hits(total=False):
+    # Consultas respondidas pelo memo: na rerun atual ou (total=True) na sessao inteira
+    if total:
+        return st.session_state.get('_query_memo_hits_total', 0)
+    return st.session_state.get('_query_memo_hits', 0)
+
+def run_concurrently(tarefas, timeout=15):
+    # tarefas: {nome: query builder ou funcao sem argumentos}. Builders passam pelo
+    # memo da rerun; o resto roda em threads sem acesso ao session_state.
+    resultados = {nome: None for nome in tarefas}
+    erros = {}
+
+    if '_query_memo' not in st.session_state:
+        begin_run()
+    memo = st.session_state['_query_memo']
+
+    pendentes = {}
+    chaves = {}
+    for nome, tarefa in tarefas.items():
+        if hasattr(tarefa, "execute"):
+            chave = _query_fingerprint(tarefa)
+            if not _memoizavel(chave):
+                memo.clear()
+            elif chave in memo:
+                resultados[nome] = memo[chave]
+                _contar_hit()
+                continue
+            else:
+                chaves[nome] = chave
+            pendentes[nome] = tarefa.execute
+        else:
+            pendentes[nome] = tarefa
+
+    if not pendentes:
+        return resultados, erros
+
+    executor = ThreadPoolExecutor(max_workers=len(pendentes))
+    inicio = time.monotonic()
+    futures = {nome: executor.submit(fn) for nome, fn in pendentes.items()}
+
+    for nome, fut in futures.items():
+        limite = timeout.get(nome, 15) if isinstance(timeout, dict) else timeout
+        restante = max(0, inicio + limite - time.monotonic())
+        try:
+            resultados[nome] = fut.result(timeout=restante)
+            if nome in chaves:
+                memo[chaves[nome]] = resultados[nome]
+        except Exception as e:
+            if not fut.done():
+                fut.cancel()
+                e = TimeoutError(f"{nome}: sem resposta em {limite}s")
+            erros[nome] = e
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    return resultados, erros
+
+STREAM_CHUNK_SIZE = 1000
+
+def iter_table(table, columns="*", filters=None, chunk_size=STREAM_CHUNK_SIZE, supabase=None):
+    # Le a tabela em paginas ordenadas por id (keyset), sem depender do limite de linhas do PostgREST.
+    # filters: lista de (operador, coluna, valor), ex. [("eq", "obra_id", 1), ("in_", "status", [...])]
+    supabase = supabase or get_db_client()
+    if "*" not in columns and "id" not in [c.strip() for c in columns.split(",")]:
+        columns = f"id, {columns}"
+
+    ultimo_id = None
+    while True:
+        q = supabase.table(table).select(columns)
+        for op, *args in (filters or []):
+            q = getattr(q, op)(*args)
+        if ultimo_id is not None:
+            q = q.gt("id", ultimo_id)
+        rows = q.order("id").limit(chunk_size).execute().data or []
+        if not rows:
+            break
+        for row in rows:
+            yield row
+        ultimo_id = rows[-1]['id']
+
+def iter_table_chunks(table, columns="*", filters=None, chunk_size=STREAM_CHUNK_SIZE, supabase=None, dtype=None):
+    # dtype=object preserva ids inteiros e None como vieram da API (sem virar float/NaN)
+    import pandas as pd
+    chunk = []
+    for row in iter_table(table, columns, filters, chunk_size, supabase):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, dtype=dtype)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, dtype=dtype)
+
+def fetch_all(table, columns="*", filters=None, chunk_size=STREAM_CHUNK_SIZE, supabase=None):
+    return list(iter_table(table, columns, filters, chunk_size, supabase))
+
+STATUS_RESTRICAO_RESOLVIDA = ['removida', 'resolvida', 'concluida', 'concluído']
+
+def iter_restricoes_ate(obra_ids, data_fim, supabase=None):
+    if not obra_ids:
+        return iter(())
+    filtros = [
+        ("in_", "obra_id", list(obra_ids)),
+        ("or_", f"data_identificacao.lte.{data_fim},data_identificacao.is.null"),
+    ]
+    colunas = "obra_id, status, data_identificacao, data_resolucao"
+    return iter_table("pcp_restricoes", colunas, filtros, supabase=supabase)
+
+def contar_restricoes(rows, obra_ids, data_fim):
+    # Contagem de restricoes ativas/removidas por obra na data_fim (YYYY-MM-DD).
+    resumo = {obra_id: {'ativas': 0, 'removidas': 0} for obra_id in obra_ids}
+    for r in rows:
+        if r.get('obra_id') not in resumo:
+            continue
+        data_ident = r.get('data_identificacao')
+        if data_ident and str(data_ident)[:10] > data_fim:
+            continue
+        status = str(r.get('status') or '').strip().lower()
+        data_res = r.get('data_resolucao')
+        if status in STATUS_RESTRICAO_RESOLVIDA and (not data_res or str(data_res)[:10] <= data_fim):
+            resumo[r['obra_id']]['removidas'] += 1
+        else:
+            resumo[r['obra_id']]['ativas'] += 1
+    return resumo
+
+def fetch_restricoes_resumo(obra_ids, data_fim, supabase=None):
+    return contar_restricoes(iter_restricoes_ate(obra_ids, data_fim, supabase), obra_ids, data_fim)
+
+def valor_json(v):
+    # Converte escalares numpy/pandas e NaN para tipos que o PostgREST aceita
+    if isinstance(v, (list, dict)):
+        return v
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return None
+    if hasattr(v, 'item'):
+        v = v.item()
+    try:
+        if v != v:  # NaN/NaT vindos de frames
+            return None
+    except TypeError:  # pd.NA
+        return None
+    # frames guardam inteiros como float quando ha NaN na coluna; colunas inteiras rejeitam "50.0"
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+def normalizar_valor(v):
+    # None, NaN e '' contam como vazio; datas comparam pelo texto ISO
+    v = valor_json(v)
+    if isinstance(v, str) and v.strip() == '':
+        return None
+    if isinstance(v, datetime):
+        return v.date().isoformat() if v.time() == datetime.min.time() else v.isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+def montar_patch(original, novos):
+    # So os campos de novos que mudaram em relacao a linha carregada (dict ou Series)
+    return {c: valor_json(v) for c, v in novos.items() if normalizar_valor(v) != normalizar_valor(original.get(c))}
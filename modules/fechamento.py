@@ -0,0 +1,58 @@
+from modules import database
+from modules import indicadores
+
+# Snapshot da semana para o historico do Dashboard. Tudo e gravado por uma unica chamada
+# RPC (sql/pcp_fechar_semana.sql), que apaga e regrava a semana dentro de uma transacao.
+RPC_FECHAR_SEMANA = "pcp_fechar_semana"
+META_PADRAO = 80.0
+
+def cabecalho(obra_id, data_referencia, mes, ano, semana_ref):
+    return {
+        "obra_id": obra_id,
+        "mes": mes,
+        "ano": ano,
+        "semana_ref": semana_ref,
+        "data_referencia": data_referencia,
+    }
+
+def linhas_indicadores(cab, ppc, pap, meta=META_PADRAO):
+    return [
+        {**cab, "tipo_indicador": tipo, "valor_percentual": database.valor_json(valor), "meta_percentual": meta}
+        for tipo, valor in (("PPC", ppc), ("PAP", pap))
+    ]
+
+def linhas_problemas(cab, causas):
+    # causas: Series/dict causa -> quantidade (ex.: indicadores.contar_causas)
+    return [
+        {**cab, "problema_descricao": causa, "quantidade": int(qtd)}
+        for causa, qtd in causas.items() if causa
+    ]
+
+def linha_irr(cab, totais, removidas, irr, meta=META_PADRAO):
+    return {
+        **cab,
+        "restricoes_totais": database.valor_json(totais),
+        "restricoes_removidas": database.valor_json(removidas),
+        "irr_percentual": database.valor_json(irr),
+        "meta_percentual": meta,
+    }
+
+def snapshot_programacao(cab, df):
+    # PPC/PAP e causas de Nao Concluido da programacao da semana
+    kpis = indicadores.resumo(df)
+    causas = indicadores.contar_causas(df, indicadores.STATUS_CAUSA_FECHAMENTO)
+    return {
+        "dados_indicadores": linhas_indicadores(cab, kpis['ppc'], kpis['pap']),
+        "problemas": linhas_problemas(cab, causas),
+    }
+
+def fechar_semana(obra_id, data_referencia, dados_indicadores=None, problemas=None, irr=None, supabase=None):
+    # None deixa o bloco como esta; lista vazia limpa o bloco da semana
+    supabase = supabase or database.get_db_client()
+    return supabase.rpc(RPC_FECHAR_SEMANA, {
+        "p_obra_id": obra_id,
+        "p_data_referencia": data_referencia,
+        "p_indicadores": dados_indicadores,
+        "p_problemas": problemas,
+        "p_irr": irr,
+    }).execute()
@@ -0,0 +1,250 @@
+import streamlit as st
+import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import database
+
+# Frames de pagina guardados na sessao. Escritas aplicam a linha devolvida pelo PostgREST
+# direto no frame (sem reler a tabela); a releitura em segundo plano so acontece depois do
+# FRAME_TTL ou quando recarregar() e chamado.
+FRAME_TTL = 60
+RECONCILIAR_WORKERS = 2
+# Fila write-behind: alteracoes seguidas no mesmo campo viram um unico UPDATE por linha
+FILA_JANELA = 5
+
+@st.cache_resource
+def _get_executor():
+    return ThreadPoolExecutor(max_workers=RECONCILIAR_WORKERS, thread_name_prefix="reconciliar")
+
+def _frames():
+    if '_frames' not in st.session_state:
+        st.session_state['_frames'] = {}
+    return st.session_state['_frames']
+
+def _montar(rows, preparar):
+    df = pd.DataFrame(rows or [])
+    return preparar(df) if preparar else df
+
+def _fila():
+    if '_fila_escrita' not in st.session_state:
+        st.session_state['_fila_escrita'] = {}
+    return st.session_state['_fila_escrita']
+
+def _com_dados(df, row_id, dados, preparar):
+    atual = df[df['id'] == row_id].to_dict('records') if 'id' in df.columns else []
+    base = atual[0] if atual else {"id": row_id}
+    return _substituir(df, _montar([{**base, **dados}], preparar))
+
+def _com_fila(chave, df, preparar):
+    # Uma releitura do banco ainda nao tem o que esta na fila; reaplica por cima
+    for (_, row_id), entrada in _fila().items():
+        if entrada["chave"] == chave and 'id' in df.columns and (df['id'] == row_id).any():
+            df = _com_dados(df, row_id, entrada["campos"], preparar)
+    return df
+
+def _agendar(item):
+    # O loader roda numa thread: precisa ter capturado o client e nao pode usar st.session_state
+    item["futuro"] = _get_executor().submit(item["loader"])
+    item["versao_futuro"] = item["versao"]
+
+def _aplicar_reconciliacao(chave, item):
+    futuro = item["futuro"]
+    if futuro is None or not futuro.done():
+        return
+    item["futuro"] = None
+    if futuro.exception() is not None:
+        return
+    if item["versao_futuro"] != item["versao"]:
+        # houve escrita local depois que a leitura comecou; le de novo
+        _agendar(item)
+        return
+    item["df"] = _com_fila(chave, _montar(futuro.result(), item["preparar"]), item["preparar"])
+    item["carregado_em"] = time.time()
+
+def carregar(chave, loader, preparar=None):
+    # loader() -> lista de dicts; preparar(df) -> df com colunas derivadas (roda no script, pode usar caches do st)
+    frames = _frames()
+    item = frames.get(chave)
+    if item is None:
+        item = {
+            "df": _com_fila(chave, _montar(loader(), preparar), preparar),
+            "loader": loader,
+            "preparar": preparar,
+            "versao": 0,
+            "futuro": None,
+            "versao_futuro": None,
+            "carregado_em": time.time(),
+        }
+        frames[chave] = item
+        return item["df"]
+
+    item["loader"] = loader
+    item["preparar"] = preparar
+    _aplicar_reconciliacao(chave, item)
+    if item["futuro"] is None and time.time() - item["carregado_em"] > FRAME_TTL:
+        _agendar(item)
+    return item["df"]
+
+def embed_locais(obra_id):
+    # insert/update nao devolvem o embed pcp_locais(nome, ordem); refaz a partir do cache de locais
+    def preparar(df):
+        if 'local_id' not in df.columns:
+            return df
+        locais = {l['id']: {"nome": l['nome'], "ordem": l.get('ordem')} for l in database.get_locais(obra_id)}
+        df['pcp_locais'] = df['local_id'].map(lambda i: locais.get(i))
+        return df
+    return preparar
+
+def obter(chave):
+    item = _frames().get(chave)
+    return None if item is None else item["df"]
+
+def invalidar(chave=None):
+    if chave is None:
+        _frames().clear()
+    else:
+        _frames().pop(chave, None)
+
+def _substituir(df, novos):
+    # Troca (ou acrescenta) as linhas por id, mantendo a ordem do frame
+    if novos.empty:
+        return df
+    por_id = {r['id']: r for r in novos.to_dict('records')}
+    registros = []
+    for r in df.to_dict('records'):
+        if r.get('id') in por_id:
+            r = {**r, **por_id.pop(r['id'])}
+        registros.append(r)
+    registros.extend(por_id.values())
+    colunas = list(df.columns) + [c for c in novos.columns if c not in df.columns]
+    return pd.DataFrame(registros, columns=colunas)
+
+def _patch_frame(chave, fn):
+    # So altera o frame em memoria; a releitura fica para o TTL ou para recarregar()
+    item = _frames().get(chave)
+    if item is None:
+        return
+    item["df"] = fn(item["df"])
+    item["versao"] += 1
+
+def recarregar(chave):
+    # Agenda uma releitura em segundo plano (se ja nao houver uma em andamento)
+    item = _frames().get(chave)
+    if item is not None and item["futuro"] is None:
+        _agendar(item)
+
+def patch_local(chave, row_id, dados):
+    # So no frame (ex.: quando a escrita foi feita por outro caminho)
+    item = _frames().get(chave)
+    if item is None:
+        return
+    _patch_frame(chave, lambda df: _com_dados(df, row_id, dados, item["preparar"]))
+
+def _aplicar_rows(chave, rows):
+    item = _frames().get(chave)
+    if item is None or not rows:
+        return
+    novos = _montar(rows, item["preparar"])
+    _patch_frame(chave, lambda df: _substituir(df, novos))
+
+def inserir(chave, table, dados, supabase=None):
+    supabase = supabase or database.get_db_client()
+    rows = database.run_query(supabase.table(table).insert(dados)).data or []
+    _aplicar_rows(chave, rows)
+    return rows
+
+def atualizar_lote(chave, rpc, linhas, supabase=None):
+    # RPC de UPDATE em lote que devolve as linhas atualizadas; ids que nao existem mais ficam de fora
+    supabase = supabase or database.get_db_client()
+    rows = database.run_query(supabase.rpc(rpc, {"p_linhas": linhas})).data or []
+    _aplicar_rows(chave, rows)
+    return rows
+
+def atualizar(chave, table, row_id, dados, supabase=None):
+    supabase = supabase or database.get_db_client()
+    rows = database.run_query(supabase.table(table).update(dados).eq("id", row_id)).data
+    if rows:
+        _aplicar_rows(chave, rows)
+    else:
+        # sem representacao de volta (ex.: RLS): aplica o que foi enviado
+        patch_local(chave, row_id, dados)
+    return rows
+
+def atualizar_alterados(chave, table, row_id, original, novos, supabase=None):
+    # Envia so os campos que mudaram; sem mudancas nao faz requisicao. Devolve o patch enviado.
+    patch = database.montar_patch(original, novos)
+    if patch:
+        atualizar(chave, table, row_id, patch, supabase)
+    return patch
+
+def excluir(chave, table, row_id, supabase=None):
+    supabase = supabase or database.get_db_client()
+    database.run_query(supabase.table(table).delete().eq("id", row_id))
+    _patch_frame(chave, lambda df: df[df['id'] != row_id].reset_index(drop=True) if 'id' in df.columns else df)
+
+def enfileirar(chave, table, row_id, dados):
+    # Aplica no frame na hora e guarda so o ultimo valor de cada campo ate descarregar().
+    # O valor carregado de cada campo fica guardado para descartar idas e voltas (marca/desmarca).
+    entrada = _fila().get((table, row_id))
+    if entrada is None:
+        entrada = {"chave": chave, "campos": {}, "originais": {}, "desde": time.time()}
+        _fila()[(table, row_id)] = entrada
+    df = obter(chave)
+    atual = {}
+    if df is not None and 'id' in df.columns:
+        linhas = df[df['id'] == row_id].to_dict('records')
+        atual = linhas[0] if linhas else {}
+    for campo, valor in dados.items():
+        entrada["originais"].setdefault(campo, atual.get(campo))
+        entrada["campos"][campo] = valor
+    patch_local(chave, row_id, dados)
+
+def pendentes(chave=None):
+    return sum(1 for e in _fila().values() if chave is None or e["chave"] == chave)
+
+def descarregar(supabase=None, chave=None):
+    # Um UPDATE por linha com os campos que de fato mudaram. O que falhar continua na fila
+    # para a proxima tentativa. Devolve (linhas enviadas, erros).
+    fila = _fila()
+    enviados = 0
+    erros_por_chave = {}
+    enviados_por_chave = set()
+    for (table, row_id), entrada in list(fila.items()):
+        if chave is not None and entrada["chave"] != chave:
+            continue
+        erros_chave = erros_por_chave.setdefault(entrada["chave"], [])
+        patch = database.montar_patch(entrada["originais"], entrada["campos"])
+        try:
+            if patch:
+                atualizar(entrada["chave"], table, row_id, patch, supabase)
+                enviados += 1
+                enviados_por_chave.add(entrada["chave"])
+        except Exception as e:
+            erros_chave.append(f"{table} #{row_id}: {e}")
+            continue
+        fila.pop((table, row_id), None)
+
+    # Erros ficam por frame: um envio parcial (chave=...) nao apaga os erros dos outros
+    if '_fila_erros' not in st.session_state:
+        st.session_state['_fila_erros'] = {}
+    st.session_state['_fila_erros'].update(erros_por_chave)
+    # Uma releitura por frame depois do envio, para reconciliar com o banco
+    for c in enviados_por_chave:
+        if not erros_por_chave.get(c):
+            recarregar(c)
+    erros = [e for lista in erros_por_chave.values() for e in lista]
+    return enviados, erros
+
+def descarregar_vencidos(supabase=None, janela=FILA_JANELA):
+    # Envia tudo se a alteracao mais antiga da fila ja passou da janela
+    fila = _fila()
+    if fila and time.time() - min(e["desde"] for e in fila.values()) >= janela:
+        return descarregar(supabase)
+    return 0, erros_fila()
+
+def erros_fila(chave=None):
+    erros = st.session_state.get('_fila_erros', {})
+    if chave is not None:
+        return list(erros.get(chave, []))
+    return [e for lista in erros.values() for e in lista]
@@ -0,0 +1,65 @@
+import builtins
+import os
+import sys
+import time
+
+# Com PCP_IMPORT_REPORT=1, mede o tempo de cada import novo ate o primeiro relatorio
+# (tempo inclusivo: um modulo inclui os que ele mesmo importa)
+ATIVO = os.environ.get("PCP_IMPORT_REPORT", "") not in ("", "0")
+
+_import_original = builtins.__import__
+_registros = []
+_nivel = 0
+_inicio = None
+_impresso = False
+
+def _modulos_novos(name, fromlist):
+    novos = [] if name in sys.modules else [name]
+    for nome in fromlist or ():
+        if nome != "*" and f"{name}.{nome}" not in sys.modules:
+            novos.append(f"{name}.{nome}")
+    return novos
+
+def _import_cronometrado(name, globals=None, locals=None, fromlist=(), level=0):
+    global _nivel
+    novos = [] if level else _modulos_novos(name, fromlist)
+    if not novos:
+        return _import_original(name, globals, locals, fromlist, level)
+
+    _nivel += 1
+    t0 = time.perf_counter()
+    try:
+        return _import_original(name, globals, locals, fromlist, level)
+    finally:
+        _nivel -= 1
+        _registros.append((", ".join(novos), (time.perf_counter() - t0) * 1000, _nivel))
+
+def instalar():
+    global _inicio
+    if not ATIVO or _impresso or builtins.__import__ is _import_cronometrado:
+        return
+    _inicio = time.perf_counter()
+    builtins.__import__ = _import_cronometrado
+
+def desinstalar():
+    if builtins.__import__ is _import_cronometrado:
+        builtins.__import__ = _import_original
+
+def relatorio(limite=25):
+    # Linhas "ms  modulo" dos imports de primeiro nivel, do mais lento para o mais rapido
+    topo = sorted((r for r in _registros if r[2] == 0), key=lambda r: r[1], reverse=True)
+    linhas = [f"{ms:9.1f} ms  {nome}" for nome, ms, _ in topo[:limite]]
+    total = sum(r[1] for r in topo)
+    linhas.append(f"{total:9.1f} ms  total em imports ({len(_registros)} modulos)")
+    if _inicio is not None:
+        linhas.append(f"{(time.perf_counter() - _inicio) * 1000:9.1f} ms  desde instalar()")
+    return "\n".join(linhas)
+
+def imprimir_relatorio(arquivo=None):
+    # Imprime uma unica vez por processo (o script do Streamlit roda de novo a cada interacao)
+    global _impresso
+    if not ATIVO or _impresso:
+        return
+    _impresso = True
+    desinstalar()
+    print("Tempo de import na inicializacao:\n" + relatorio(), file=arquivo or sys.stderr)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+DIAS_SEMANA = ['seg', 'ter', 'qua', 'qui', 'sex']
+
+# Motivos contados no relatorio (tudo que nao foi concluido) e no fechamento da semana (so Nao Concluido)
+STATUS_COM_CAUSA = ['Nao Concluido', 'Em Andamento']
+STATUS_CAUSA_FECHAMENTO = ['Nao Concluido']
+
+COLUNAS_SOMA = ['atividades', 'concluidas', 'pontos_ppc', 'dias_prog', 'dias_exec']
+
+def coluna(df, nome):
+    if nome in df.columns:
+        return df[nome]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _texto_preenchido(serie):
+    return serie.notna() & serie.astype(str).str.strip().ne('')
+
+def _chaves(df, por):
+    if por is None:
+        return None
+    if isinstance(por, str):
+        return coluna(df, por).rename(por)
+    return [coluna(df, c).rename(c) for c in por]
+
+def pontos_ppc(df):
+    # Concluido vale 1; Em Andamento vale percentual/100; o resto vale 0
+    status = coluna(df, 'status')
+    perc = pd.to_numeric(coluna(df, 'percentual'), errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    return np.where(status.eq('Concluido'), 1.0, np.where(status.eq('Em Andamento'), perc / 100.0, 0.0))
+
+def dias_programados(df):
+    # Matriz linhas x dias: o dia conta como programado quando rec_<dia> tem algum texto
+    return pd.DataFrame({d: _texto_preenchido(coluna(df, f'rec_{d}')) for d in DIAS_SEMANA}, index=df.index)
+
+def dias_executados(df, programados=None):
+    if programados is None:
+        programados = dias_programados(df)
+    feitos = pd.DataFrame({d: coluna(df, f'feito_{d}').isin([True]) for d in DIAS_SEMANA}, index=df.index)
+    return programados & feitos
+
+def agregar(df, por=None):
+    # Somas por grupo; como sao aditivas, parciais de varios chunks podem ser juntadas com combinar()
+    programados = dias_programados(df)
+    base = pd.DataFrame({
+        'atividades': np.ones(len(df), dtype=int),
+        'concluidas': coluna(df, 'status').eq('Concluido').astype(int).to_numpy(),
+        'pontos_ppc': pontos_ppc(df),
+        'dias_prog': programados.sum(axis=1).to_numpy(),
+        'dias_exec': dias_executados(df, programados).sum(axis=1).to_numpy(),
+    }, index=df.index)
+
+    if por is None:
+        return base.sum().to_frame().T
+    return base.groupby(_chaves(df, por), sort=False, dropna=False).sum()
+
+def combinar(parciais):
+    parciais = [p for p in parciais if p is not None and len(p)]
+    if not parciais:
+        return None
+    junto = pd.concat(parciais)
+    return junto.groupby(level=list(range(junto.index.nlevels)), sort=False, dropna=False).sum()
+
+def com_percentuais(somas):
+    if somas is None:
+        somas = pd.DataFrame(columns=COLUNAS_SOMA)
+    r = somas.copy()
+    r['ppc'] = (r['pontos_ppc'] / r['atividades'].replace(0, np.nan) * 100).fillna(0.0)
+    r['pap'] = (r['dias_exec'] / r['dias_prog'].replace(0, np.nan) * 100).fillna(0.0)
+    return r
+
+def calcular_indicadores(df, por=None):
+    return com_percentuais(agregar(df, por))
+
+def resumo(df):
+    linha = calcular_indicadores(df).iloc[0]
+    return {
+        "atividades": int(linha['atividades']),
+        "concluidas": int(linha['concluidas']),
+        "dias_prog": int(linha['dias_prog']),
+        "dias_exec": int(linha['dias_exec']),
+        "pontos_ppc": float(linha['pontos_ppc']),
+        "ppc": float(linha['ppc']),
+        "pap": float(linha['pap']),
+    }
+
+def contar_causas(df, status=STATUS_COM_CAUSA, por=None):
+    # Series com a quantidade por causa (ou por grupo + causa quando por e informado)
+    causa = coluna(df, 'causa')
+    mascara = coluna(df, 'status').isin(status) & _texto_preenchido(causa)
+    if por is None:
+        return causa[mascara].value_counts()
+
+    chaves = _chaves(df[mascara], por)
+    chaves = (chaves if isinstance(chaves, list) else [chaves]) + [causa[mascara]]
+    return causa[mascara].groupby(chaves, sort=False, dropna=False).size()
+
+def causas_por_grupo(contagem):
+    # {grupo: {causa: qtd}} a partir de contar_causas(..., por=...)
+    grupos = {}
+    if contagem is None:
+        return grupos
+    for chave, qtd in contagem.items():
+        grupo = chave[0] if len(chave) == 2 else chave[:-1]
+        grupos.setdefault(grupo, {})[chave[-1]] = int(qtd)
+    return grupos
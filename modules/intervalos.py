@@ -0,0 +1,60 @@
+# Arvore de intervalos centrada. Cada no guarda os intervalos que contem o seu centro,
+# ordenados por inicio e por fim; consulta por janela em O(log n + k).
+# Funciona com qualquer tipo comparavel (datas, Timestamps, numeros).
+
+def _construir(itens):
+    if not itens:
+        return None
+    pontos = sorted(p for ini, fim, _ in itens for p in (ini, fim))
+    centro = pontos[len(pontos) // 2]
+    esq, dir_, meio = [], [], []
+    for item in itens:
+        if item[1] < centro:
+            esq.append(item)
+        elif item[0] > centro:
+            dir_.append(item)
+        else:
+            meio.append(item)
+    por_ini = sorted(meio, key=lambda i: i[0])
+    por_fim = sorted(meio, key=lambda i: i[1], reverse=True)
+    return (centro, por_ini, por_fim, _construir(esq), _construir(dir_))
+
+class ArvoreIntervalos:
+    def __init__(self, itens):
+        # itens: (inicio, fim, chave) com inicio <= fim
+        itens = list(itens)
+        self.tamanho = len(itens)
+        self._raiz = _construir(itens)
+
+    def __len__(self):
+        return self.tamanho
+
+    def consultar(self, ini, fim):
+        # Chaves dos intervalos que cruzam [ini, fim] (bordas inclusivas)
+        encontrados = []
+        pilha = [self._raiz]
+        while pilha:
+            no = pilha.pop()
+            if no is None:
+                continue
+            centro, por_ini, por_fim, esq, dir_ = no
+            if fim < centro:
+                for a, _, chave in por_ini:
+                    if a > fim:
+                        break
+                    encontrados.append(chave)
+                pilha.append(esq)
+            elif ini > centro:
+                for _, b, chave in por_fim:
+                    if b < ini:
+                        break
+                    encontrados.append(chave)
+                pilha.append(dir_)
+            else:
+                encontrados.extend(chave for _, _, chave in por_ini)
+                pilha.append(esq)
+                pilha.append(dir_)
+        return encontrados
+
+    def ativos_em(self, data):
+        return self.consultar(data, data)
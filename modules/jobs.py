@@ -0,0 +1,92 @@
+import streamlit as st
+import multiprocessing
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+MAX_WORKERS = 2
+
+@st.cache_resource
+def _get_context():
+    return multiprocessing.get_context("spawn")
+
+@st.cache_resource
+def _get_pool():
+    return ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=_get_context())
+
+@st.cache_resource
+def _get_manager():
+    return _get_context().Manager()
+
+@st.cache_resource
+def _get_progresso():
+    return _get_manager().dict()
+
+def _executar(job_id, progresso, fn, args, kwargs):
+    def reportar(etapa, pct):
+        progresso[job_id] = {"etapa": etapa, "pct": float(pct)}
+
+    reportar("Iniciando", 0.0)
+    try:
+        resultado = fn(*args, progresso=reportar, **kwargs)
+    except Exception:
+        progresso[job_id] = {"etapa": "Erro", "pct": 1.0}
+        raise RuntimeError(traceback.format_exc())
+    reportar("Concluido", 1.0)
+    return resultado
+
+def _jobs():
+    if 'jobs' not in st.session_state:
+        st.session_state['jobs'] = {}
+    return st.session_state['jobs']
+
+def submit_job(tipo, fn, *args, **kwargs):
+    # fn precisa ser uma funcao de modulo (picklable) que aceite o argumento progresso=callback(etapa, pct)
+    job_id = uuid.uuid4().hex
+    progresso = _get_progresso()
+    future = _get_pool().submit(_executar, job_id, progresso, fn, args, kwargs)
+    _jobs()[job_id] = {
+        "id": job_id,
+        "tipo": tipo,
+        "args": args,
+        "future": future,
+    }
+    return job_id
+
+def job_status(job_id):
+    job = _jobs().get(job_id)
+    if not job:
+        return None
+
+    future = job["future"]
+    info = _get_progresso().get(job_id) or {"etapa": "Na fila", "pct": 0.0}
+    status = {
+        "id": job_id,
+        "tipo": job["tipo"],
+        "args": job["args"],
+        "etapa": info["etapa"],
+        "progresso": info["pct"],
+        "resultado": None,
+        "erro": None,
+    }
+
+    if not future.done():
+        status["status"] = "executando" if job_id in _get_progresso() else "na_fila"
+    elif future.cancelled():
+        status["status"] = "cancelado"
+    elif future.exception() is not None:
+        status["status"] = "erro"
+        status["erro"] = str(future.exception())
+    else:
+        status["status"] = "concluido"
+        status["resultado"] = future.result()
+    return status
+
+def has_pending_jobs(tipo=None):
+    return any(not j["future"].done() for j in _jobs().values() if tipo is None or j["tipo"] == tipo)
+
+def clear_job(job_id):
+    job = _jobs().pop(job_id, None)
+    if job:
+        job["future"].cancel()
+        _get_progresso().pop(job_id, None)
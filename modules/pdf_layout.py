@@ -0,0 +1,84 @@
+MAX_LARGURAS_CACHE = 50000
+MAX_QUEBRAS_CACHE = 20000
+
+_larguras = {}
+_quebras = {}
+
+def _chave_fonte(pdf):
+    return (pdf.font_family, pdf.font_style, round(pdf.font_size_pt, 2))
+
+def largura_texto(pdf, texto):
+    # Medidas por fonte/estilo/tamanho: cada palavra e medida uma unica vez
+    chave = (_chave_fonte(pdf), texto)
+    w = _larguras.get(chave)
+    if w is None:
+        w = pdf.get_string_width(texto)
+        if len(_larguras) >= MAX_LARGURAS_CACHE:
+            _larguras.clear()
+        _larguras[chave] = w
+    return w
+
+def _quebrar_palavra(pdf, palavra, largura):
+    partes = []
+    atual = ""
+    for ch in palavra:
+        if atual and largura_texto(pdf, atual + ch) > largura:
+            partes.append(atual)
+            atual = ch
+        else:
+            atual += ch
+    if atual:
+        partes.append(atual)
+    return partes
+
+def quebrar_linhas(pdf, texto, largura):
+    chave = (_chave_fonte(pdf), texto, round(largura, 2))
+    linhas = _quebras.get(chave)
+    if linhas is not None:
+        return linhas
+
+    linhas = []
+    espaco = largura_texto(pdf, " ")
+    for paragrafo in str(texto).split("\n"):
+        atual = []
+        w_atual = 0.0
+        for palavra in paragrafo.split():
+            w = largura_texto(pdf, palavra)
+            if w > largura:
+                pedacos = _quebrar_palavra(pdf, palavra, largura)
+                if atual:
+                    linhas.append(" ".join(atual))
+                linhas.extend(pedacos[:-1])
+                atual = [pedacos[-1]]
+                w_atual = largura_texto(pdf, pedacos[-1])
+            elif atual and w_atual + espaco + w > largura:
+                linhas.append(" ".join(atual))
+                atual = [palavra]
+                w_atual = w
+            else:
+                w_atual += (espaco if atual else 0) + w
+                atual.append(palavra)
+        linhas.append(" ".join(atual))
+
+    if len(_quebras) >= MAX_QUEBRAS_CACHE:
+        _quebras.clear()
+    _quebras[chave] = linhas
+    return linhas
+
+def layout_linha_tabela(pdf, textos, larguras, altura_linha=6, padding=2):
+    # Quebra cada celula uma vez; a altura e o desenho usam as mesmas linhas.
+    # Reserva 6 por linha (texto desenhado a 5), mesma folga da tabela original
+    margem = getattr(pdf, "c_margin", 1)
+    celulas = [quebrar_linhas(pdf, txt, larguras[i] - 2 - 2 * margem) for i, txt in enumerate(textos)]
+    altura = max(len(linhas) for linhas in celulas) * altura_linha + 2 * padding
+    return altura, celulas
+
+def desenhar_linha_tabela(pdf, x, y, larguras, celulas, altura, alinhamentos, altura_linha=5, padding=2):
+    for i, linhas in enumerate(celulas):
+        _ = pdf.rect(x, y, larguras[i], altura, 'DF')
+        y_txt = y + padding
+        for linha in linhas:
+            _ = pdf.set_xy(x + 1, y_txt)
+            _ = pdf.cell(larguras[i] - 2, altura_linha, linha, border=0, align=alinhamentos[i])
+            y_txt += altura_linha
+        x += larguras[i]
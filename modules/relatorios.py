@@ -0,0 +1,862 @@
+import io
+import os
+import json
+import hashlib
+import tempfile
+import uuid
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import fpdf
+from fpdf import FPDF
+
+from modules import database
+from modules import indicadores
+from modules import pdf_layout
+
+CACHE_DIR = os.environ.get("PCP_REPORT_CACHE_DIR", os.path.join(".cache", "relatorios"))
+CACHE_MAX_BYTES = int(os.environ.get("PCP_REPORT_CACHE_MAX_MB", "200")) * 1024 * 1024
+# Relatorios avulsos (consolidados) ficam fora do cache LRU e expiram por idade
+SAIDA_DIR = os.environ.get("PCP_REPORT_OUTPUT_DIR", os.path.join(".cache", "relatorios_saida"))
+SAIDA_TTL = int(os.environ.get("PCP_REPORT_OUTPUT_TTL", "3600"))
+
+PERFIS_IMAGEM = {
+    "alta": {"formato": "png", "dpi": 300},
+    "padrao": {"formato": "png", "dpi": 150},
+    "leve": {"formato": "jpg", "dpi": 120, "qualidade": 80},
+    "vetor": {"formato": "svg"},
+}
+PERFIL_IMAGEM_PADRAO = os.environ.get("PCP_REPORT_IMAGE_PROFILE", "padrao")
+
+RELATORIO_WORKERS = int(os.environ.get("PCP_REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# fpdf2 aceita BytesIO (e SVG) em pdf.image; o PyFPDF 1.7 so aceita caminho de arquivo
+FPDF_ACEITA_BUFFER = int(str(getattr(fpdf, "FPDF_VERSION", "1")).split(".")[0]) >= 2
+
+def figura_para_buffer(fig, perfil=PERFIL_IMAGEM_PADRAO):
+    cfg = PERFIS_IMAGEM.get(perfil, PERFIS_IMAGEM["padrao"])
+    kwargs = {"format": cfg["formato"], "bbox_inches": "tight", "facecolor": fig.get_facecolor()}
+    if "dpi" in cfg:
+        kwargs["dpi"] = cfg["dpi"]
+    if "qualidade" in cfg:
+        kwargs["pil_kwargs"] = {"quality": cfg["qualidade"], "optimize": True}
+
+    buf = io.BytesIO()
+    fig.savefig(buf, **kwargs)
+    buf.seek(0)
+    return buf, cfg["formato"]
+
+def inserir_figura(pdf, fig, perfil, x, y, w):
+    if perfil == "vetor" and not FPDF_ACEITA_BUFFER:
+        perfil = "padrao"
+
+    buf, formato = figura_para_buffer(fig, perfil)
+    try:
+        return inserir_imagem(pdf, buf, formato, x, y, w)
+    except Exception:
+        if formato != "svg":
+            raise
+        buf, formato = figura_para_buffer(fig, "padrao")
+        return inserir_imagem(pdf, buf, formato, x, y, w)
+
+def inserir_imagem(pdf, buf, formato, x, y, w):
+    if FPDF_ACEITA_BUFFER:
+        return pdf.image(buf, x=x, y=y, w=w)
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{formato}")
+    try:
+        tmp.write(buf.getvalue())
+        tmp.close()
+        return pdf.image(tmp.name, x=x, y=y, w=w)
+    finally:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+
+def renderizar_grafico_obra(tarefa):
+    # Roda nos workers do pool de graficos (ou em serie): recebe so dados simples e devolve a imagem pronta.
+    m = tarefa["metricas"]
+    causas = sorted(tarefa["causas"].items(), key=lambda x: x[1], reverse=True)[:8]
+
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['text.color'] = '#374151'
+
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(14, 4.5), gridspec_kw={'width_ratios': [1.2, 1.6, 0.8]})
+    _ = fig.patch.set_facecolor('#ffffff')
+
+    for ax in (ax1, ax2, ax3):
+        _ = ax.spines['top'].set_visible(False)
+        _ = ax.spines['right'].set_visible(False)
+        _ = ax.spines['left'].set_visible(False)
+        _ = ax.spines['bottom'].set_color('#D1D5DB')
+        _ = ax.tick_params(axis='y', length=0)
+
+    nomes_ind = ['PPC', 'PAP', 'IRR']
+    valores_ind = [m['PPC'], m['PAP'], m['IRR']]
+    _ = ax1.grid(axis='y', linestyle='-', alpha=0.3, color='#D1D5DB')
+    rects = ax1.bar(nomes_ind, valores_ind, 0.5, color=['#E37026', '#374151', '#0E6655'], zorder=3)
+    _ = ax1.axhline(y=80, color='#9CA3AF', linestyle='--', linewidth=1.2, label='META: 80%', zorder=2)
+    _ = ax1.set_ylim(0, 115)
+    _ = ax1.set_title('Indicadores (%)', fontweight='bold', color='#111827', fontsize=11, pad=8)
+    _ = ax1.legend(loc='upper right', frameon=False, fontsize=8)
+    for rect in rects:
+        height = rect.get_height()
+        _ = ax1.text(rect.get_x() + rect.get_width() / 2, height + 2, f'{height:.0f}%', ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    if causas:
+        labels = [c[0][:35] for c in causas][::-1]
+        sizes = [c[1] for c in causas][::-1]
+        _ = ax2.barh(labels, sizes, color='#E37026', zorder=3)
+        _ = ax2.grid(axis='x', linestyle='-', alpha=0.3, color='#D1D5DB')
+        _ = ax2.tick_params(axis='y', labelsize=8)
+        for i, v in enumerate(sizes):
+            _ = ax2.text(v + 0.05, i, str(v), va='center', fontweight='bold', fontsize=8)
+    else:
+        _ = ax2.text(0.5, 0.5, "Nenhum problema registrado", ha='center', va='center', fontweight='bold', color='#9CA3AF')
+        _ = ax2.set_xticks([])
+        _ = ax2.set_yticks([])
+    _ = ax2.set_title('Causas de nao cumprimento', fontweight='bold', color='#111827', fontsize=11, pad=8)
+
+    ativas = m['total_rest'] - m['removidas']
+    if m['total_rest'] > 0:
+        _ = ax3.bar([0], [ativas], color='#E37026', width=0.5, zorder=3, label='Ativas')
+        _ = ax3.bar([0], [m['removidas']], bottom=[ativas], color='#374151', width=0.5, zorder=3, label='Removidas')
+        if ativas > 0:
+            _ = ax3.text(0, ativas / 2, str(ativas), ha='center', va='center', fontweight='bold', color='white')
+        if m['removidas'] > 0:
+            _ = ax3.text(0, ativas + m['removidas'] / 2, str(m['removidas']), ha='center', va='center', fontweight='bold', color='white')
+        _ = ax3.legend(loc='upper right', frameon=False, fontsize=8)
+    else:
+        _ = ax3.text(0.5, 0.5, "Sem restricoes", ha='center', va='center', fontweight='bold', color='#9CA3AF')
+    _ = ax3.set_xticks([])
+    _ = ax3.set_title('Restricoes', fontweight='bold', color='#111827', fontsize=11, pad=8)
+
+    _ = fig.tight_layout(pad=2.0)
+    buf, formato = figura_para_buffer(fig, tarefa["perfil"])
+    _ = plt.close(fig)
+    return buf.getvalue(), formato
+
+_pool_graficos = None
+_pool_graficos_lock = threading.Lock()
+
+def _get_pool_graficos(workers):
+    # Um pool por processo, criado no primeiro relatorio e reaproveitado pelos seguintes:
+    # o custo de subir interpretador + matplotlib nos workers spawn so e pago uma vez
+    global _pool_graficos
+    with _pool_graficos_lock:
+        if _pool_graficos is None:
+            ctx = multiprocessing.get_context("spawn")
+            _pool_graficos = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        return _pool_graficos
+
+def _descartar_pool_graficos(pool):
+    global _pool_graficos
+    with _pool_graficos_lock:
+        if _pool_graficos is pool:
+            _pool_graficos = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def renderizar_graficos_obras(tarefas, workers=RELATORIO_WORKERS):
+    if workers <= 1 or len(tarefas) < 2:
+        return [renderizar_grafico_obra(t) for t in tarefas]
+    pool = _get_pool_graficos(workers)
+    try:
+        return list(pool.map(renderizar_grafico_obra, tarefas))
+    except BrokenProcessPool:
+        # Um worker morreu (ex.: OOM): o proximo relatorio sobe um pool novo, este sai em serie
+        _descartar_pool_graficos(pool)
+        return [renderizar_grafico_obra(t) for t in tarefas]
+
+def s(txt):
+    if txt is None:
+        return ""
+    return str(txt).replace('•', '-').replace('–', '-').replace('—', '-').replace('“', '"').replace('”', '"').encode('latin-1', 'replace').decode('latin-1')
+
+class PDFReport(FPDF):
+    def footer(self):
+        _ = self.set_y(-15)
+        _ = self.set_font('Arial', 'I', 8)
+        _ = self.set_text_color(150, 150, 150)
+        _ = self.cell(0, 10, s(f'Pagina {self.page_no()}'), 0, 0, 'C')
+
+def carregar_dados_semana(data_ref_str, supabase=None):
+    supabase = supabase or database.get_db_client()
+
+    resp_obras = supabase.table("pcp_obras").select("id, nome").execute()
+    mapa_obras = {o['id']: o['nome'] for o in resp_obras.data} if resp_obras.data else {}
+
+    dados_prog = database.fetch_all("pcp_programacao_semanal", filters=[("eq", "data_inicio_semana", data_ref_str)], supabase=supabase)
+
+    try:
+        data_fim_semana = (datetime.strptime(data_ref_str, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+        obra_ids = {d.get('obra_id') for d in dados_prog if d.get('obra_id') is not None}
+        resumo_rest = database.fetch_restricoes_resumo(obra_ids, data_fim_semana, supabase=supabase)
+    except:
+        resumo_rest = {}
+
+    return {
+        "data_ref": data_ref_str,
+        "obras": mapa_obras,
+        "programacao": dados_prog,
+        "restricoes": resumo_rest,
+    }
+
+def semanas_no_periodo(data_ini, data_fim):
+    inicio = data_ini - timedelta(days=data_ini.weekday())
+    semanas = []
+    while inicio <= data_fim:
+        semanas.append(inicio.strftime("%Y-%m-%d"))
+        inicio += timedelta(weeks=1)
+    return semanas
+
+def carregar_dados_periodo(semanas, supabase=None):
+    # Uma leitura por tabela para todo o periodo; devolve os dados de cada semana no formato de carregar_dados_semana
+    supabase = supabase or database.get_db_client()
+    if not semanas:
+        return []
+
+    resp_obras = supabase.table("pcp_obras").select("id, nome").execute()
+    mapa_obras = {o['id']: o['nome'] for o in resp_obras.data} if resp_obras.data else {}
+
+    filtros_prog = [("gte", "data_inicio_semana", semanas[0]), ("lte", "data_inicio_semana", semanas[-1])]
+    prog_por_semana = {sem: [] for sem in semanas}
+    for row in database.iter_table("pcp_programacao_semanal", filters=filtros_prog, supabase=supabase):
+        sem = str(row.get('data_inicio_semana'))[:10]
+        if sem in prog_por_semana:
+            prog_por_semana[sem].append(row)
+
+    fim_periodo = (datetime.strptime(semanas[-1], "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+    todas_obras = {d.get('obra_id') for rows in prog_por_semana.values() for d in rows if d.get('obra_id') is not None}
+    rows_rest = list(database.iter_restricoes_ate(todas_obras, fim_periodo, supabase))
+
+    periodo = []
+    for sem in semanas:
+        dados_prog = prog_por_semana[sem]
+        data_fim_semana = (datetime.strptime(sem, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+        obra_ids = {d.get('obra_id') for d in dados_prog if d.get('obra_id') is not None}
+        periodo.append({
+            "data_ref": sem,
+            "obras": mapa_obras,
+            "programacao": dados_prog,
+            "restricoes": database.contar_restricoes(rows_rest, obra_ids, data_fim_semana),
+        })
+    return periodo
+
+RPC_VERSAO_SEMANAL = "pcp_versao_relatorio_semanal"
+
+def versao_dados_semana(data_ref_str, supabase=None):
+    # Contagem/maior id/ultimo atualizado_em das tabelas do relatorio (sql/pcp_versao_relatorio_semanal.sql)
+    supabase = supabase or database.get_db_client()
+    return supabase.rpc(RPC_VERSAO_SEMANAL, {"p_data_referencia": data_ref_str}).execute().data
+
+def fingerprint_dados(dados):
+    conteudo = json.dumps(dados, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(conteudo).hexdigest()
+
+def _cache_path(chave):
+    return os.path.join(CACHE_DIR, f"{chave}.pdf")
+
+def _cache_get(chave):
+    caminho = _cache_path(chave)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        os.utime(caminho, None)
+    except OSError:
+        pass
+    return caminho
+
+def _cache_put(chave, conteudo):
+    def escrever(tmp):
+        with open(tmp, "wb") as f:
+            f.write(conteudo)
+    return _cache_put_arquivo(chave, escrever)
+
+def _cache_put_arquivo(chave, escrever):
+    # escrever(caminho_tmp) grava o arquivo; so entra no cache (os.replace) se terminar sem erro
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho = _cache_path(chave)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(tmp)
+        os.replace(tmp, caminho)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _cache_evict()
+    return caminho
+
+def _cache_evict():
+    arquivos = []
+    for nome in os.listdir(CACHE_DIR):
+        if not nome.endswith(".pdf"):
+            continue
+        caminho = os.path.join(CACHE_DIR, nome)
+        try:
+            st_arq = os.stat(caminho)
+        except OSError:
+            continue
+        arquivos.append((st_arq.st_mtime, st_arq.st_size, caminho))
+
+    total = sum(a[1] for a in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+def _saida_limpar():
+    limite = datetime.now().timestamp() - SAIDA_TTL
+    for nome in os.listdir(SAIDA_DIR):
+        caminho = os.path.join(SAIDA_DIR, nome)
+        try:
+            if os.stat(caminho).st_mtime < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+def _saida_put_arquivo(prefixo, escrever):
+    # Mesmo esquema atomico do cache, mas num diretorio proprio: nao disputa espaco com os semanais
+    os.makedirs(SAIDA_DIR, exist_ok=True)
+    _saida_limpar()
+    caminho = os.path.join(SAIDA_DIR, f"{prefixo}_{uuid.uuid4().hex[:12]}.pdf")
+    fd, tmp = tempfile.mkstemp(dir=SAIDA_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(tmp)
+        os.replace(tmp, caminho)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return caminho
+
+def preparar_relatorio_semanal(data_ref_str, progresso=None, perfil_imagem=PERFIL_IMAGEM_PADRAO):
+    # Gera (ou reaproveita do cache em disco) o PDF da semana; devolve o caminho do arquivo.
+    # A chave vem de uma consulta de versao; os dados completos so sao lidos quando o cache falha.
+    if progresso:
+        progresso("Verificando cache", 0.02)
+
+    supabase = database.get_db_client()
+    try:
+        versao = versao_dados_semana(data_ref_str, supabase)
+    except Exception:
+        versao = None  # RPC ainda nao instalada: cai no fingerprint dos dados, como antes
+
+    if versao is not None:
+        chave = f"semanal_{data_ref_str}_{perfil_imagem}_v{fingerprint_dados(versao)[:20]}"
+        caminho = _cache_get(chave)
+        if caminho:
+            return {"arquivo": caminho, "cache": True}
+
+    if progresso:
+        progresso("Carregando dados", 0.05)
+    dados = carregar_dados_semana(data_ref_str, supabase)
+
+    if versao is None:
+        chave = f"semanal_{data_ref_str}_{perfil_imagem}_{fingerprint_dados(dados)[:20]}"
+        caminho = _cache_get(chave)
+        if caminho:
+            return {"arquivo": caminho, "cache": True}
+
+    conteudo = renderizar_pdf_semanal(dados, progresso=progresso, perfil_imagem=perfil_imagem)
+    return {"arquivo": _cache_put(chave, conteudo), "cache": False}
+
+def salvar_pdf_semanal(dados, caminho, perfil_imagem=PERFIL_IMAGEM_PADRAO, workers=1):
+    # O CLI ja paraleliza por semana; por padrao os graficos de cada semana saem em serie
+    conteudo = renderizar_pdf_semanal(dados, perfil_imagem=perfil_imagem, workers=workers)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    return caminho
+
+def calcular_metricas(indicadores_obra, restricoes):
+    ppc = float(indicadores_obra["ppc"])
+    pap = float(indicadores_obra["pap"])
+
+    rest_removidas = restricoes.get('removidas', 0)
+    rest_ativas = restricoes.get('ativas', 0)
+    total_rest = rest_removidas + rest_ativas
+    irr = (rest_removidas / total_rest * 100) if total_rest > 0 else 0.0
+
+    status_txt = "Dentro do planejado" if ppc >= 80 else ("Atencao" if ppc >= 60 else "Abaixo do esperado")
+
+    return {
+        "PPC": ppc, "PAP": pap, "IRR": irr,
+        "removidas": rest_removidas, "total_rest": total_rest,
+        "status": status_txt
+    }
+
+def desenhar_figura_resumo(nomes_obras, metricas_obras, contagem_causas):
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['text.color'] = '#374151'
+    
+    fig = plt.figure(figsize=(14, 9.5))
+    _ = fig.patch.set_facecolor('#ffffff')
+    
+    ax1 = plt.subplot2grid((2, 2), (0, 0))
+    ax2 = plt.subplot2grid((2, 2), (0, 1))
+    ax3 = plt.subplot2grid((2, 2), (1, 0))
+    ax4 = plt.subplot2grid((2, 2), (1, 1))
+
+    x = np.arange(len(nomes_obras))
+    width = 0.45 
+    
+    def clean_ax(ax):
+        _ = ax.spines['top'].set_visible(False)
+        _ = ax.spines['right'].set_visible(False)
+        _ = ax.spines['left'].set_visible(False)
+        _ = ax.spines['bottom'].set_color('#D1D5DB')
+        _ = ax.tick_params(axis='y', length=0)
+
+    _ = ax1.grid(axis='y', linestyle='-', alpha=0.3, color='#D1D5DB')
+    ppcs = [metricas_obras[n]["PPC"] for n in nomes_obras]
+    rects1 = ax1.bar(x, ppcs, width, color='#E37026', zorder=3)
+    _ = ax1.axhline(y=80, color='#E37026', linestyle='-', linewidth=1.5, label='META: 80%', zorder=2, alpha=0.7)
+    
+    _ = ax1.set_title('PPC(%) por OBRAS e SEMANAS', fontweight='bold', color='#111827', fontsize=12, pad=10)
+    _ = ax1.set_xticks(x)
+    _ = ax1.set_xticklabels([n[:15] for n in nomes_obras], fontweight='bold', rotation=45, ha='right', fontsize=9)
+    _ = ax1.set_ylim(0, 115)
+    clean_ax(ax1)
+    _ = ax1.legend(loc='upper right', frameon=False, fontsize=9)
+    for rect in rects1:
+        height = rect.get_height()
+        _ = ax1.text(rect.get_x() + rect.get_width() / 2, height + 2, f'{height:.0f}%', 
+                     ha='center', va='bottom', fontweight='bold', fontsize=9, zorder=5,
+                     bbox=dict(facecolor='white', edgecolor='none', pad=1, alpha=0.8))
+
+    _ = ax2.grid(axis='y', linestyle='-', alpha=0.3, color='#D1D5DB')
+    paps = [metricas_obras[n]["PAP"] for n in nomes_obras]
+    rects2 = ax2.bar(x, paps, width, color='#374151', zorder=3)
+    _ = ax2.axhline(y=80, color='#374151', linestyle='-', linewidth=1.5, label='META: 80%', zorder=2, alpha=0.7)
+    _ = ax2.set_title('MEDIO PRAZO/PAP (%) por Obra', fontweight='bold', color='#111827', fontsize=12, pad=10)
+    _ = ax2.set_xticks(x)
+    _ = ax2.set_xticklabels([n[:15] for n in nomes_obras], fontweight='bold', rotation=45, ha='right', fontsize=9)
+    _ = ax2.set_ylim(0, 115)
+    clean_ax(ax2)
+    for rect in rects2:
+        height = rect.get_height()
+        _ = ax2.text(rect.get_x() + rect.get_width() / 2, height + 2, f'{height:.0f}%', ha='center', va='bottom', fontweight='bold', fontsize=9)
+
+    if contagem_causas:
+        causas_ord = sorted(contagem_causas.items(), key=lambda x: x[1], reverse=True)
+        labels = [c[0] for c in causas_ord]
+        sizes = [c[1] for c in causas_ord]
+        cores_donut = ['#4A235A', '#0E6655', '#E37026', '#B03A2E', '#D0D3D4', '#117A65', '#9A7D0A', '#17202A'][:len(labels)]
+        
+        wedges, texts, autotexts = ax3.pie(
+            sizes, autopct='%1.1f%%', pctdistance=0.85, 
+            colors=cores_donut, startangle=90, 
+            textprops={'fontsize': 8, 'weight': 'bold', 'color': 'white'}
+        )
+        centre_circle = plt.Circle((0,0),0.65,fc='white')
+        _ = ax3.add_artist(centre_circle)
+        
+        _ = ax3.legend(wedges, labels, title="Motivos", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1), frameon=False, fontsize=8)
+        _ = ax3.set_title('LISTA DE PROBLEMAS', fontweight='bold', color='#111827', fontsize=12)
+    else:
+        _ = ax3.text(0.5, 0.5, "Nenhum problema registrado", ha='center', va='center', fontweight='bold', color='#9CA3AF')
+        _ = ax3.axis('off')
+
+    _ = ax4.grid(axis='y', linestyle='-', alpha=0.3, color='#D1D5DB')
+    obras_rest = [n for n in nomes_obras if metricas_obras[n]['total_rest'] > 0]
+    
+    if obras_rest:
+        x_rest = np.arange(len(obras_rest))
+        vol_ativas = [metricas_obras[o]['total_rest'] - metricas_obras[o]['removidas'] for o in obras_rest]
+        vol_removidas = [metricas_obras[o]['removidas'] for o in obras_rest]
+        
+        rects_ativas = ax4.bar(x_rest, vol_ativas, color='#E37026', width=0.45, zorder=3, label='Adicionadas/Ativas')
+        rects_remov = ax4.bar(x_rest, vol_removidas, bottom=vol_ativas, color='#374151', width=0.45, zorder=3, label='Removidas')
+        
+        _ = ax4.set_xticks(x_rest)
+        _ = ax4.set_xticklabels([o[:15] for o in obras_rest], fontweight='bold', rotation=45, ha='right', fontsize=9)
+        _ = ax4.set_title('Restricoes por Obra', fontweight='bold', color='#111827', fontsize=12, pad=10)
+        _ = ax4.legend(loc='upper right', frameon=False, fontsize=9)
+        clean_ax(ax4)
+        
+        for i in range(len(x_rest)):
+            v_a = vol_ativas[i]
+            v_r = vol_removidas[i]
+            x_pos = x_rest[i]
+            
+            if v_a > 0:
+                _ = ax4.text(x_pos, v_a / 2, str(v_a), ha='center', va='center', fontweight='bold', color='white', zorder=5)
+            if v_r > 0:
+                _ = ax4.text(x_pos, v_a + (v_r / 2), str(v_r), ha='center', va='center', fontweight='bold', color='white', zorder=5)
+    else:
+        _ = ax4.text(0.5, 0.5, "Nenhuma restricao registrada", ha='center', va='center', fontweight='bold', color='#9CA3AF')
+        clean_ax(ax4)
+
+    _ = plt.tight_layout(pad=3.0)
+    return fig
+
+def escrever_resumo(pdf, titulo, legenda, nomes_obras, metricas_obras, fig, perfil_imagem):
+    _ = pdf.add_page()
+
+    _ = pdf.set_font("Arial", size=18, style='B')
+    _ = pdf.set_text_color(31, 41, 55)
+    _ = pdf.cell(0, 8, txt=s(titulo), ln=True, align='L')
+    
+    _ = pdf.set_font("Arial", size=11)
+    _ = pdf.set_text_color(107, 114, 128)
+    _ = pdf.cell(0, 6, txt=s(f"- {legenda}"), ln=True, align='L')
+    _ = pdf.cell(0, 6, txt=s("Responsaveis pelo relatorio: Central de Planejamento"), ln=True, align='L')
+    _ = pdf.ln(5)
+
+    _ = pdf.set_font("Arial", size=12, style='B')
+    _ = pdf.set_text_color(227, 112, 38)
+    _ = pdf.cell(0, 8, txt=s("1. Indicadores Semanais"), ln=True)
+    
+    _ = pdf.set_fill_color(55, 65, 81)
+    _ = pdf.set_text_color(255, 255, 255)
+    _ = pdf.set_draw_color(209, 213, 219)
+    _ = pdf.set_font("Arial", size=9, style='B')
+    
+    larguras_ind = [10, 50, 25, 30, 25, 40]
+    
+    _ = pdf.cell(larguras_ind[0], 8, txt=s("Item"), border=1, fill=True, align='C')
+    _ = pdf.cell(larguras_ind[1], 8, txt=s("Obra"), border=1, fill=True)
+    _ = pdf.cell(larguras_ind[2], 8, txt=s("PPC (%)"), border=1, fill=True, align='C')
+    _ = pdf.cell(larguras_ind[3], 8, txt=s("Medio Prazo (%)"), border=1, fill=True, align='C')
+    _ = pdf.cell(larguras_ind[4], 8, txt=s("IRR (%)"), border=1, fill=True, align='C')
+    _ = pdf.cell(larguras_ind[5], 8, txt=s("Status"), border=1, fill=True, ln=True, align='C')
+
+    _ = pdf.set_text_color(75, 85, 99)
+    _ = pdf.set_font("Arial", size=9)
+    
+    zebra = False
+    for i, nome in enumerate(nomes_obras):
+        if zebra:
+            _ = pdf.set_fill_color(249, 250, 251)
+        else:
+            _ = pdf.set_fill_color(255, 255, 255)
+        zebra = not zebra
+        
+        m = metricas_obras[nome]
+        _ = pdf.cell(larguras_ind[0], 7, txt=s(str(i+1)), border=1, fill=True, align='C')
+        _ = pdf.cell(larguras_ind[1], 7, txt=s(f" {nome[:30]}"), border=1, fill=True)
+        _ = pdf.cell(larguras_ind[2], 7, txt=s(f"{m['PPC']:.2f}%"), border=1, fill=True, align='C')
+        _ = pdf.cell(larguras_ind[3], 7, txt=s(f"{m['PAP']:.2f}%"), border=1, fill=True, align='C')
+        _ = pdf.cell(larguras_ind[4], 7, txt=s(f"{m['IRR']:.2f}%"), border=1, fill=True, align='C')
+        _ = pdf.cell(larguras_ind[5], 7, txt=s(m['status']), border=1, fill=True, align='C', ln=True)
+
+    _ = pdf.ln(5)
+
+    inserir_figura(pdf, fig, perfil_imagem, x=10, y=pdf.get_y(), w=190)
+    _ = plt.close(fig)
+
+# Larguras da tabela de programacao: Atividade, Detalhe, Status, Motivo/Problema
+LARGURAS_PROG = [45, 65, 25, 45]
+ALINHAMENTOS_PROG = ['L', 'L', 'C', 'L']
+
+def escrever_cabecalho_obra(pdf, primeira, obra, m, img_obra, formato_obra):
+    _ = pdf.add_page()
+    
+    if primeira:
+        _ = pdf.set_font("Arial", size=14, style='B')
+        _ = pdf.set_text_color(31, 41, 55)
+        _ = pdf.cell(0, 10, txt=s("2. Evolucao Fisica por Obra"), ln=True)
+        _ = pdf.ln(2)
+
+    _ = pdf.set_fill_color(243, 244, 246)
+    _ = pdf.set_draw_color(227, 112, 38)
+    _ = pdf.set_line_width(0.5)
+    _ = pdf.rect(15, pdf.get_y(), 180, 10, 'DF')
+    
+    _ = pdf.set_font("Arial", size=12, style='B')
+    _ = pdf.set_text_color(31, 41, 55)
+    _ = pdf.set_xy(18, pdf.get_y() + 2)
+    _ = pdf.cell(0, 6, txt=s(f"{obra.upper()}"), ln=True, align='L', border=0)
+    _ = pdf.set_line_width(0.2)
+    _ = pdf.ln(6)
+
+    _ = pdf.set_font("Arial", size=10)
+    _ = pdf.set_text_color(55, 65, 81)
+    
+    _ = pdf.cell(0, 6, txt=s(f"- PPC Semanal: {m['PPC']:.2f}%"), ln=True)
+    _ = pdf.cell(0, 6, txt=s(f"- Medio Prazo (PAP): {m['PAP']:.2f}%"), ln=True)
+    _ = pdf.cell(0, 6, txt=s(f"- Restricoes - IRR: {m['IRR']:.2f}% ({m['removidas']} restricoes removidas de {m['total_rest']} ativas/adicionadas)"), ln=True)
+    _ = pdf.ln(2)
+
+    _ = inserir_imagem(pdf, io.BytesIO(img_obra), formato_obra, x=15, y=None, w=180)
+    _ = pdf.ln(4)
+
+    _ = pdf.set_font("Arial", size=10, style='B')
+    _ = pdf.set_text_color(227, 112, 38)
+    _ = pdf.cell(0, 6, txt=s("Detalhamento da Programacao"), ln=True)
+    _ = pdf.ln(1)
+    
+    _ = pdf.set_fill_color(55, 65, 81)
+    _ = pdf.set_text_color(255, 255, 255)
+    _ = pdf.set_draw_color(55, 65, 81)
+    _ = pdf.set_font("Arial", size=9, style='B')
+    
+    _ = pdf.cell(LARGURAS_PROG[0], 8, txt=s(" Atividade"), border=1, fill=True)
+    _ = pdf.cell(LARGURAS_PROG[1], 8, txt=s(" Detalhe"), border=1, fill=True)
+    _ = pdf.cell(LARGURAS_PROG[2], 8, txt=s("Status"), border=1, fill=True, align='C')
+    _ = pdf.cell(LARGURAS_PROG[3], 8, txt=s(" Motivo/Problema"), border=1, fill=True, ln=True)
+
+    _ = pdf.set_text_color(75, 85, 99)
+    _ = pdf.set_font("Arial", size=8)
+    _ = pdf.set_draw_color(209, 213, 219)
+
+def escrever_linha_programacao(pdf, atv, zebra):
+    # Só exibe o motivo se a tarefa não foi concluída
+    motivo_txt = s(atv.get('causa', '')) if atv.get('status') in ['Nao Concluido', 'Em Andamento'] else ''
+    
+    textos_linha = [
+        s(atv.get('atividade', '')), 
+        s(atv.get('detalhe', '')), 
+        s(atv.get('status', '')), 
+        motivo_txt
+    ]
+    
+    h_linha, celulas = pdf_layout.layout_linha_tabela(pdf, textos_linha, LARGURAS_PROG)
+    
+    if pdf.get_y() + h_linha > 270:
+        _ = pdf.add_page()
+
+    x_start, y_start = pdf.get_x(), pdf.get_y()
+    _ = pdf.set_fill_color(249, 250, 251) if zebra else pdf.set_fill_color(255, 255, 255)
+    
+    pdf_layout.desenhar_linha_tabela(pdf, x_start, y_start, LARGURAS_PROG, celulas, h_linha, ALINHAMENTOS_PROG)
+    _ = pdf.set_xy(15, y_start + h_linha)
+    return not zebra
+
+def escrever_subtitulo_semana(pdf, semana):
+    if pdf.get_y() + 14 > 270:
+        _ = pdf.add_page()
+    _ = pdf.set_font("Arial", size=8, style='B')
+    _ = pdf.set_fill_color(243, 244, 246)
+    _ = pdf.cell(sum(LARGURAS_PROG), 6, txt=s(f" Semana de {_formatar_data(semana)}"), border=1, fill=True, ln=True)
+    _ = pdf.set_font("Arial", size=8)
+
+def _formatar_data(data_str):
+    try:
+        return datetime.strptime(data_str, "%Y-%m-%d").strftime('%d/%m/%Y')
+    except:
+        return data_str
+
+def legenda_semana(data_ref_str):
+    try:
+        data_obj = datetime.strptime(data_ref_str, "%Y-%m-%d")
+        data_fim_obj = data_obj + timedelta(days=4)
+        return f"Semana: {data_obj.strftime('%d/%m/%Y')} a {data_fim_obj.strftime('%d/%m/%Y')}"
+    except:
+        return f"Semana: {data_ref_str}"
+
+def saida_pdf(pdf):
+    saida = pdf.output(dest='S')
+    if isinstance(saida, str):
+        return saida.encode('latin-1')
+    return bytes(saida)
+
+def renderizar_pdf_semanal(dados, progresso=None, perfil_imagem=PERFIL_IMAGEM_PADRAO, workers=RELATORIO_WORKERS):
+    def etapa(descricao, pct):
+        if progresso:
+            progresso(descricao, pct)
+
+    data_ref_str = dados["data_ref"]
+    mapa_obras = dados["obras"]
+    dados_prog = dados["programacao"]
+
+    restricoes_por_obra = {}
+    for obra_id, contagem in dados["restricoes"].items():
+        restricoes_por_obra[mapa_obras.get(obra_id, "Outros")] = contagem
+
+    df_prog = pd.DataFrame(dados_prog) if dados_prog else pd.DataFrame(columns=['obra_id'])
+    df_prog['obra_nome'] = df_prog['obra_id'].map(mapa_obras).fillna("Outros")
+
+    por_obra = indicadores.calcular_indicadores(df_prog, por='obra_nome')
+    causas_obras = indicadores.causas_por_grupo(indicadores.contar_causas(df_prog, por='obra_nome'))
+    contagem_causas = indicadores.contar_causas(df_prog).to_dict()
+
+    atividades_por_obra = {}
+    for d, nome in zip(dados_prog, df_prog['obra_nome']):
+        atividades_por_obra.setdefault(nome, []).append(d)
+
+    nomes_obras = list(por_obra.index)
+    metricas_obras = {nome: calcular_metricas(por_obra.loc[nome], restricoes_por_obra.get(nome, {})) for nome in nomes_obras}
+
+    etapa("Desenhando graficos", 0.25)
+    fig = desenhar_figura_resumo(nomes_obras, metricas_obras, contagem_causas)
+
+    etapa("Desenhando graficos por obra", 0.35)
+
+    perfil_obras = "padrao" if perfil_imagem == "vetor" else perfil_imagem
+    graficos_obras = renderizar_graficos_obras([
+        {"nome": nome, "metricas": metricas_obras[nome], "causas": causas_obras.get(nome, {}), "perfil": perfil_obras}
+        for nome in nomes_obras
+    ], workers=workers)
+
+    etapa("Montando documento", 0.5)
+
+    pdf = PDFReport()
+    _ = pdf.set_margins(15, 15, 15)
+    escrever_resumo(pdf, "Relatorio de Acompanhamento Semanal de Obras", legenda_semana(data_ref_str), nomes_obras, metricas_obras, fig, perfil_imagem)
+
+    for i, obra in enumerate(nomes_obras):
+        etapa(f"Detalhando {obra}", 0.5 + 0.45 * i / max(1, len(nomes_obras)))
+        img_obra, formato_obra = graficos_obras[i]
+        escrever_cabecalho_obra(pdf, i == 0, obra, metricas_obras[obra], img_obra, formato_obra)
+
+        zebra_prog = False
+        for atv in atividades_por_obra[obra]:
+            zebra_prog = escrever_linha_programacao(pdf, atv, zebra_prog)
+        _ = pdf.ln(8)
+
+    return saida_pdf(pdf)
+
+# Modo streaming: 1a passada so com as colunas dos indicadores (nada de linhas guardadas),
+# 2a passada obra a obra: uma leitura em chunks por obra, paginas escritas e linhas descartadas
+# antes da proxima obra.
+COLUNAS_AGREGACAO = "obra_id, data_inicio_semana, status, percentual, causa, " + ", ".join(f"rec_{d}, feito_{d}" for d in indicadores.DIAS_SEMANA)
+COLUNAS_TABELA = "data_inicio_semana, atividade, detalhe, status, causa"
+
+def escrever_pdf_streaming(data_ini_str, data_fim_str, caminho, progresso=None, perfil_imagem=PERFIL_IMAGEM_PADRAO, chunk_size=database.STREAM_CHUNK_SIZE, supabase=None):
+    def etapa(descricao, pct):
+        if progresso:
+            progresso(descricao, pct)
+
+    supabase = supabase or database.get_db_client()
+    consolidado = data_ini_str != data_fim_str
+
+    resp_obras = supabase.table("pcp_obras").select("id, nome").execute()
+    mapa_obras = {o['id']: o['nome'] for o in resp_obras.data} if resp_obras.data else {}
+
+    etapa("Calculando indicadores", 0.1)
+    filtros_periodo = [("gte", "data_inicio_semana", data_ini_str), ("lte", "data_inicio_semana", data_fim_str)]
+    parciais = []
+    parciais_causas = []
+    ids_obras = {}
+    for chunk in database.iter_table_chunks("pcp_programacao_semanal", COLUNAS_AGREGACAO, filtros_periodo, chunk_size, supabase, dtype=object):
+        # linhas sem obra nao tem pagina de detalhamento
+        chunk = chunk[chunk['obra_id'].notna()]
+        parciais.append(indicadores.agregar(chunk, por='obra_id'))
+        parciais_causas.append(indicadores.contar_causas(chunk, por='obra_id'))
+        ids_obras.update(dict.fromkeys(chunk['obra_id']))
+        del chunk
+    ids_obras = list(ids_obras)
+
+    por_obra = indicadores.com_percentuais(indicadores.combinar(parciais))
+    causas_obras = indicadores.causas_por_grupo(indicadores.combinar(parciais_causas))
+    contagem_causas = {}
+    for causas in causas_obras.values():
+        for causa, qtd in causas.items():
+            contagem_causas[causa] = contagem_causas.get(causa, 0) + qtd
+    del parciais, parciais_causas
+
+    # data_fim_str e o inicio da ultima semana do periodo
+    data_fim_periodo = (datetime.strptime(data_fim_str, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+    try:
+        resumo_rest = database.fetch_restricoes_resumo(set(ids_obras), data_fim_periodo, supabase=supabase)
+    except:
+        resumo_rest = {}
+
+    nomes = {obra_id: mapa_obras.get(obra_id, "Outros") for obra_id in ids_obras}
+    metricas = {obra_id: calcular_metricas(por_obra.loc[obra_id], resumo_rest.get(obra_id, {})) for obra_id in ids_obras}
+    del por_obra
+
+    etapa("Desenhando graficos", 0.2)
+    fig = desenhar_figura_resumo(
+        [nomes[o] for o in ids_obras],
+        {nomes[o]: metricas[o] for o in ids_obras},
+        contagem_causas,
+    )
+
+    if consolidado:
+        titulo = "Relatorio Consolidado de Obras"
+        legenda = f"Periodo: {_formatar_data(data_ini_str)} a {_formatar_data(data_fim_periodo)}"
+    else:
+        titulo = "Relatorio de Acompanhamento Semanal de Obras"
+        legenda = legenda_semana(data_ini_str)
+
+    pdf = PDFReport()
+    _ = pdf.set_margins(15, 15, 15)
+    escrever_resumo(pdf, titulo, legenda, [nomes[o] for o in ids_obras], {nomes[o]: metricas[o] for o in ids_obras}, fig, perfil_imagem)
+    del fig
+
+    perfil_obras = "padrao" if perfil_imagem == "vetor" else perfil_imagem
+    for i, obra_id in enumerate(ids_obras):
+        etapa(f"Detalhando {nomes[obra_id]}", 0.25 + 0.7 * i / max(1, len(ids_obras)))
+        img_obra, formato_obra = renderizar_grafico_obra({"nome": nomes[obra_id], "metricas": metricas[obra_id], "causas": causas_obras.pop(obra_id, {}), "perfil": perfil_obras})
+        escrever_cabecalho_obra(pdf, i == 0, nomes[obra_id], metricas[obra_id], img_obra, formato_obra)
+        del img_obra
+
+        # So as linhas desta obra ficam em memoria; iter_table le em ordem de id
+        linhas_por_semana = {}
+        filtros_obra = [("eq", "obra_id", obra_id)] + filtros_periodo
+        for atv in database.iter_table("pcp_programacao_semanal", COLUNAS_TABELA, filtros_obra, chunk_size, supabase):
+            linhas_por_semana.setdefault(str(atv['data_inicio_semana'])[:10], []).append(atv)
+
+        zebra_prog = False
+        for semana in sorted(linhas_por_semana):
+            if consolidado:
+                escrever_subtitulo_semana(pdf, semana)
+            for atv in linhas_por_semana[semana]:
+                zebra_prog = escrever_linha_programacao(pdf, atv, zebra_prog)
+        del linhas_por_semana
+        _ = pdf.ln(8)
+
+    etapa("Gravando arquivo", 0.97)
+    _ = pdf.output(caminho)
+    return caminho
+
+def _vmhwm_kb():
+    # Pico de RSS do processo (Linux); zerado por zerar_pico_rss()
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+def zerar_pico_rss():
+    # Os workers de jobs sao reaproveitados: sem zerar, o pico seria o maior de todos os jobs anteriores.
+    # Devolve a linha de base (MB) quando o kernel nao permite zerar o pico.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return 0.0
+    except OSError:
+        return pico_rss_mb() or 0.0
+
+def pico_rss_mb():
+    kb = _vmhwm_kb()
+    if kb is None:
+        try:
+            import resource
+        except ImportError:
+            return None
+        # ru_maxrss vem em KB no Linux
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / 1024, 1)
+
+def preparar_relatorio_consolidado(data_ini_str, data_fim_str, progresso=None, perfil_imagem=PERFIL_IMAGEM_PADRAO):
+    # Relatorio de um intervalo de semanas (ex.: trimestre) em modo streaming; devolve o caminho e o pico de memoria.
+    base_rss = zerar_pico_rss()
+    prefixo = f"consolidado_{data_ini_str}_{data_fim_str}_{perfil_imagem}"
+    caminho = _saida_put_arquivo(prefixo, lambda tmp: escrever_pdf_streaming(data_ini_str, data_fim_str, tmp, progresso=progresso, perfil_imagem=perfil_imagem))
+    pico = pico_rss_mb()
+    return {
+        "arquivo": caminho,
+        "cache": False,
+        "pico_rss_mb": None if pico is None else round(pico - base_rss, 1),
+    }
@@ -47,6 +47,7 @@ def app(obra_id):
                     if nova_ativ:
                         try:
                             supabase.table("pcp_atividades_padrao").insert({"atividade": str(nova_ativ).upper()}).execute()
+                            database.clear_reference_cache("pcp_atividades_padrao")
                             st.toast("Adicionado com sucesso!")
                             time.sleep(0.5)
                             st.rerun()
@@ -58,8 +59,7 @@ def app(obra_id):
         st.markdown("---")
         
         try:
-            resp_ativ = supabase.table("pcp_atividades_padrao").select("*").order("atividade").execute()
-            df_ativ = pd.DataFrame(resp_ativ.data)
+            df_ativ = pd.DataFrame(database.get_atividades_padrao())
             
             if not df_ativ.empty:
                 for idx, row in df_ativ.iterrows():
@@ -72,6 +72,7 @@ def app(obra_id):
                     
                     if st.button("Excluir", key=f"del_atv_{row['id']}", use_container_width=True):
                         supabase.table("pcp_atividades_padrao").delete().eq("id", row['id']).execute()
+                        database.clear_reference_cache("pcp_atividades_padrao")
                         st.rerun()
             else:
                 st.info("Nenhuma atividade padrao cadastrada.")
@@ -97,6 +98,7 @@ def app(obra_id):
                                 "nome": str(novo_local).upper(),
                                 "ordem": nova_ordem
                             }).execute()
+                            database.clear_reference_cache("pcp_locais")
                             st.toast("Adicionado com sucesso!")
                             time.sleep(0.5)
                             st.rerun()
@@ -108,8 +110,7 @@ def app(obra_id):
         st.markdown("---")
         
         try:
-            resp_loc = supabase.table("pcp_locais").select("*").eq("obra_id", obra_id).order("ordem").execute()
-            df_loc = pd.DataFrame(resp_loc.data)
+            df_loc = pd.DataFrame(database.get_locais(obra_id))
             
             if not df_loc.empty:
             
@@ -124,6 +125,7 @@ def app(obra_id):
                     
                     if st.button("Excluir", key=f"del_loc_{row['id']}", use_container_width=True):
                         supabase.table("pcp_locais").delete().eq("id", row['id']).execute()
+                        database.clear_reference_cache("pcp_locais")
                         st.rerun()
             else:
                 st.info("Nenhum local cadastrado para esta obra.")
@@ -143,6 +145,7 @@ def app(obra_id):
                     if novo_prob:
                         try:
                             supabase.table("pcp_lista_problemas").insert({"descricao": str(novo_prob).upper()}).execute()
+                            database.clear_reference_cache("pcp_lista_problemas")
                             st.toast("Adicionado com sucesso!")
                             time.sleep(0.5)
                             st.rerun()
@@ -156,10 +159,10 @@ def app(obra_id):
         busca_prob = st.text_input("Pesquisar problema...", key="busca_prob")
         
         try:
-            resp_prob = supabase.table("pcp_lista_problemas").select("*").order("descricao").execute()
-            df_prob = pd.DataFrame(resp_prob.data)
+            df_prob = pd.DataFrame(database.get_lista_problemas())
             
             if not df_prob.empty:
+                df_prob = df_prob.sort_values('descricao')
                 if busca_prob:
                     df_prob = df_prob[df_prob['descricao'].str.contains(busca_prob, case=False, na=False)]
                 
@@ -174,6 +177,7 @@ def app(obra_id):
                         
                         if st.button("Excluir", key=f"del_prob_{row['id']}", use_container_width=True):
                             supabase.table("pcp_lista_problemas").delete().eq("id", row['id']).execute()
+                            database.clear_reference_cache("pcp_lista_problemas")
                             st.rerun()
                 else:
                     st.info("Nenhum problema encontrado na pesquisa.")
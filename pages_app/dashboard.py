@@ -22,28 +22,41 @@ LAVIE_PALETTE = [
 BG_COLOR = 'rgba(0,0,0,0)'
 TEXT_COLOR = 'white'
 
+QUERY_TIMEOUT = 20
+
 def load_data(supabase, obra_id, start_date, end_date):
-    obras_map = {}
-    try:
-        resp_obras = supabase.table("pcp_obras").select("id, nome").execute()
-        if resp_obras.data:
-            obras_map = {o['id']: o['nome'] for o in resp_obras.data}
-    except Exception as e:
-        print(f"Erro obras: {e}")
+    def build_reader(table, date_col):
+        filtros = []
+        if obra_id and obra_id != "todos": 
+            filtros.append(("eq", "obra_id", obra_id))
+        if date_col:
+            filtros.append(("gte", date_col, start_date))
+            filtros.append(("lte", date_col, end_date))
 
-    def apply_query(table, date_col):
-        try:
-            q = supabase.table(table).select("*")
-            if obra_id and obra_id != "todos": 
-                q = q.eq("obra_id", obra_id)
+        def ler():
+            rows = database.fetch_all(table, filters=filtros, supabase=supabase)
             if date_col:
-                q = q.gte(date_col, start_date).lte(date_col, end_date)
-                q = q.order(date_col)
-            return q.execute()
-        except: return None
+                rows.sort(key=lambda r: r.get(date_col) or "")
+            return rows
+        return ler
+
+    respostas, erros = database.run_concurrently({
+        "obras": supabase.table("pcp_obras").select("id, nome").order("nome"),
+        "indicadores": build_reader("pcp_historico_indicadores", "data_referencia"),
+        "irr": build_reader("pcp_historico_irr", "data_referencia"),
+        "problemas": build_reader("pcp_historico_problemas", "data_referencia"),
+    }, timeout=QUERY_TIMEOUT)
+
+    for nome, e in erros.items():
+        print(f"Erro {nome}: {e}")
+
+    obras_map = {}
+    resp_obras = respostas["obras"]
+    if resp_obras and resp_obras.data:
+        obras_map = {o['id']: o['nome'] for o in resp_obras.data}
 
-    resp_ind = apply_query("pcp_historico_indicadores", "data_referencia")
-    df_ind = pd.DataFrame(resp_ind.data) if resp_ind and resp_ind.data else pd.DataFrame()
+    rows_ind = respostas["indicadores"]
+    df_ind = pd.DataFrame(rows_ind) if rows_ind else pd.DataFrame()
     if not df_ind.empty:
         df_ind['obra_nome'] = df_ind['obra_id'].map(obras_map).fillna("Desconhecida")
         df_ind['data_ref'] = pd.to_datetime(df_ind['data_referencia'])
@@ -67,8 +80,8 @@ def load_data(supabase, obra_id, start_date, end_date):
     else:
         df_ind = pd.DataFrame(columns=['data', 'ppc', 'pap', 'obra_nome', 'semana_ref', 'mes_ano_label', 'sort_date'])
 
-    resp_irr = apply_query("pcp_historico_irr", "data_referencia")
-    df_irr = pd.DataFrame(resp_irr.data) if resp_irr and resp_irr.data else pd.DataFrame()
+    rows_irr = respostas["irr"]
+    df_irr = pd.DataFrame(rows_irr) if rows_irr else pd.DataFrame()
     if not df_irr.empty:
         df_irr['data'] = pd.to_datetime(df_irr['data_referencia'])
         df_irr['sort_date'] = df_irr['data']
@@ -78,13 +91,13 @@ def load_data(supabase, obra_id, start_date, end_date):
             df_irr['semana_ref'] = df_irr['data'].apply(lambda d: f"Semana {d.isocalendar()[1]}")
         if 'irr_percentual' not in df_irr.columns: df_irr['irr_percentual'] = 0
 
-    resp_prob = apply_query("pcp_historico_problemas", "data_referencia")
-    df_prob = pd.DataFrame(resp_prob.data) if resp_prob and resp_prob.data else pd.DataFrame()
+    rows_prob = respostas["problemas"]
+    df_prob = pd.DataFrame(rows_prob) if rows_prob else pd.DataFrame()
     if not df_prob.empty:
         df_prob['data'] = pd.to_datetime(df_prob['data_referencia'])
         df_prob['obra_nome'] = df_prob['obra_id'].map(obras_map).fillna("Desconhecida")
 
-    return df_ind, df_irr, df_prob
+    return df_ind, df_irr, df_prob, erros
 
 def card_kpi(label, value, suffix="", border_color="#E37026"):
     st.markdown(f"""
@@ -160,7 +173,7 @@ def app(obra_id_param):
         c_filter, c_date = st.columns([1, 1])
         with c_filter:
             try:
-                obras_resp = supabase.table("pcp_obras").select("id, nome").order("nome").execute()
+                obras_resp = database.run_query(supabase.table("pcp_obras").select("id, nome").order("nome"))
             
                 opcoes = {"TODAS AS OBRAS": "todos"} 
                 
@@ -189,7 +202,9 @@ def app(obra_id_param):
         dates = st.date_input("Periodo:", [d_start, d_end])
         s_date, e_date = (dates[0], dates[1]) if len(dates) == 2 else (d_start, d_end)
             
-    df_ind, df_irr, df_prob = load_data(supabase, obra_id, s_date.strftime('%Y-%m-%d'), e_date.strftime('%Y-%m-%d'))
+    df_ind, df_irr, df_prob, erros_carga = load_data(supabase, obra_id, s_date.strftime('%Y-%m-%d'), e_date.strftime('%Y-%m-%d'))
+    if erros_carga:
+        st.warning(f"Alguns dados nao puderam ser carregados: {', '.join(erros_carga)}")
 
     st.markdown("---")
 
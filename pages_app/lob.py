@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import heapq
+import math
 from modules import database
+from modules import frames
+from modules import intervalos
 from modules import ui
 import time
 
@@ -11,32 +17,290 @@ def safe_date(val):
         return pd.to_datetime(val).to_pydatetime().replace(tzinfo=None)
     except: return None
 
-def render_custom_lob(df):
-    if df.empty:
-        st.info("Sem dados para exibir.")
-        return
+def chave_lob(obra_id):
+    return f"lob_{obra_id}"
+
+def carregar_lob(supabase, obra_id):
+    embed = frames.embed_locais(obra_id)
+    def preparar(df):
+        df = embed(df)
+        if df.empty:
+            return df
+        df['pavimento'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
+        df['ordem_pav'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
+        df['atividade_nome'] = df['atividade_nome'].fillna("Sem Nome")
+        return df
+    return frames.carregar(
+        chave_lob(obra_id),
+        lambda: supabase.table("pcp_lob_atividades").select("*").eq("obra_id", obra_id).execute().data,
+        preparar,
+    )
+
+CORES_LOB = [
+    "#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6", 
+    "#EC4899", "#6366F1", "#14B8A6", "#F97316"
+]
+ALTURA_FAIXA = 30
+LARGURA_BARRA_GL = 8
+JANELA_MESES_PADRAO = 3
+ITENS_POR_PAGINA = 20
+VIEW_LOB_ORDENADA = "pcp_lob_atividades_ordenadas"
+PASSO_PAN_MESES = 1
+
+def _datas(serie):
+    datas = pd.to_datetime(serie, errors='coerce')
+    if getattr(datas.dt, 'tz', None) is not None:
+        datas = datas.dt.tz_localize(None)
+    return datas
+
+def alocar_faixas(inicios, fins):
+    # Atividades ordenadas por inicio. Heap de (fim, faixa): a faixa que libera primeiro e reaproveitada
+    # se ja terminou; senao abre uma nova. O(n log faixas) em vez de varrer todas as faixas.
+    heap = []
+    faixas = []
+    for ini, fim in zip(inicios, fins):
+        if heap and heap[0][0] <= ini:
+            _, faixa = heapq.heapreplace(heap, (fim, heap[0][1]))
+        else:
+            faixa = len(heap)
+            heapq.heappush(heap, (fim, faixa))
+        faixas.append(faixa)
+    return faixas, len(heap)
+
+def inicios_de_mes(min_date, max_date):
+    curr = min_date.replace(day=1)
+    while curr <= max_date:
+        yield curr
+        if curr.month == 12: curr = curr.replace(year=curr.year+1, month=1)
+        else: curr = curr.replace(month=curr.month+1)
+
+def janela_em_torno(centro, meses=JANELA_MESES_PADRAO):
+    centro = pd.Timestamp(centro).normalize()
+    return centro - pd.DateOffset(months=meses), centro + pd.DateOffset(months=meses)
 
-    df['dt_ini'] = df['data_inicio'].apply(safe_date)
-    df['dt_fim'] = df['data_fim'].apply(safe_date)
+def montar_html_lob(df, hoje=None, janela=None):
+    # df com pavimento, ordem_pav, atividade_nome, data_inicio e data_fim. Devolve (html, cores por atividade);
+    # html e None quando nao ha nada para desenhar. Com janela=(ini, fim) so entram as barras que cruzam
+    # a janela, cortadas nas bordas: o tamanho do HTML acompanha o que esta visivel.
+    if 'dt_ini' not in df.columns:
+        df = df.assign(dt_ini=_datas(df['data_inicio']), dt_fim=_datas(df['data_fim']))
     df = df.dropna(subset=['dt_ini', 'dt_fim'])
+    if janela is not None:
+        min_date, max_date = pd.Timestamp(janela[0]), pd.Timestamp(janela[1])
+        df = df[(df['dt_fim'] >= min_date) & (df['dt_ini'] <= max_date)]
+    if df.empty:
+        return None, {}
+
+    df = df.assign(ini_txt=df['dt_ini'].dt.strftime('%d/%m'), fim_txt=df['dt_fim'].dt.strftime('%d/%m'))
+    if janela is None:
+        min_date = df['dt_ini'].min() - timedelta(days=2)
+        max_date = df['dt_fim'].max() + timedelta(days=5)
+    else:
+        df['dt_ini'] = df['dt_ini'].clip(lower=min_date)
+        df['dt_fim'] = df['dt_fim'].clip(upper=max_date)
+    total_days = (max_date - min_date).days
+    if total_days < 1: total_days = 1
+
+    map_colors = {atv: CORES_LOB[i % len(CORES_LOB)] for i, atv in enumerate(df['atividade_nome'].unique())}
 
+    # Pavimento de cima primeiro; dentro do pavimento por data de inicio (ordem estavel para o groupby)
+    df = df.sort_values(['ordem_pav', 'dt_ini'], ascending=[False, True], kind='mergesort')
+    df['start_pct'] = (df['dt_ini'] - min_date).dt.days / total_days * 100
+    df['width_pct'] = (df['dt_fim'] - df['dt_ini']).dt.days.clip(lower=1) / total_days * 100
+    df['cor'] = df['atividade_nome'].map(map_colors).fillna("#666")
+
+    # Marcadores e guias de mes sao iguais para todas as linhas: monta uma vez
+    meses = [(curr, (curr - min_date).days / total_days * 100) for curr in inicios_de_mes(min_date, max_date)]
+    meses = [(curr, pct) for curr, pct in meses if 0 <= pct <= 100]
+    guias = "".join(f'<div class="grid-guide" style="left: {pct}%;"></div>' for _, pct in meses)
+
+    html = ['<div class="gantt-scroll">', '<div class="gantt-header">',
+            '<div class="header-spacer">PAVIMENTO</div>', '<div class="header-timeline">']
+    html.extend(f'<div class="month-marker" style="left: {pct}%;">{curr.strftime("%b/%y").upper()}</div>' for curr, pct in meses)
+
+    hoje = hoje or datetime.now()
+    if min_date <= hoje <= max_date:
+        hoje_pos = ((hoje - min_date).days / total_days) * 100
+        html.append(f'<div class="today-line" style="left: {hoje_pos}%;"></div>')
+    html.append('</div></div>')
+
+    for pav_nome, atvs in df.groupby('pavimento', sort=False):
+        faixas, n_faixas = alocar_faixas(atvs['dt_ini'].tolist(), atvs['dt_fim'].tolist())
+        row_height = max(50, (n_faixas * ALTURA_FAIXA) + 20)
+
+        html.append(f'<div class="gantt-row" style="height: {row_height}px;">')
+        html.append(f'<div class="row-label">{pav_nome}</div>')
+        html.append('<div class="row-track">')
+        html.append(guias)
+        for row, faixa in zip(atvs[['atividade_nome', 'start_pct', 'width_pct', 'cor', 'ini_txt', 'fim_txt']].itertuples(index=False), faixas):
+            tooltip_txt = f"{row.atividade_nome} &#10;Inicio: {row.ini_txt} &#10;Fim: {row.fim_txt}"
+            html.append(f'<div class="gantt-bar" title="{tooltip_txt}" style="left: {row.start_pct}%; width: {row.width_pct}%; top: {10 + faixa * ALTURA_FAIXA}px; background-color: {row.cor};">{row.atividade_nome}</div>')
+        html.append('</div></div>')
+
+    html.append('</div>')
+    return "".join(html), map_colors
+
+def _intercalar(a, b):
+    # [a0, b0, None, a1, b1, None, ...]: segmentos independentes numa unica trace
+    saida = np.empty(3 * len(a), dtype=object)
+    saida[0::3] = a
+    saida[1::3] = b
+    saida[2::3] = None
+    return saida
+
+def figura_lob(df, janela=None, hoje=None):
+    # Linha de balanco em WebGL: por atividade, uma trace Scattergl com todas as barras (segmentos separados
+    # por None) e as linhas de inicio/fim atravessando os pavimentos. Poucas traces, qualquer numero de barras.
+    if 'dt_ini' not in df.columns:
+        df = df.assign(dt_ini=_datas(df['data_inicio']), dt_fim=_datas(df['data_fim']))
+    df = df.dropna(subset=['dt_ini', 'dt_fim'])
     if df.empty:
-        st.warning("Datas invalidas.")
+        return None
+
+    pavs = df[['pavimento', 'ordem_pav']].drop_duplicates('pavimento').sort_values('ordem_pav')['pavimento'].tolist()
+    posicao = {pav: i for i, pav in enumerate(pavs)}
+    atividades = df['atividade_nome'].unique()
+    # Atividades lado a lado dentro da faixa do pavimento para as barras nao se cobrirem
+    passo = 0.8 / len(atividades)
+
+    fig = go.Figure()
+    for k, (atv, grupo) in enumerate(df.groupby('atividade_nome', sort=False)):
+        cor = CORES_LOB[k % len(CORES_LOB)]
+        y = grupo['pavimento'].map(posicao).to_numpy(dtype=float) + (k - (len(atividades) - 1) / 2) * passo
+        texto = (grupo['pavimento'].astype(str) + "<br>" + grupo['dt_ini'].dt.strftime('%d/%m/%Y')
+                 + " a " + grupo['dt_fim'].dt.strftime('%d/%m/%Y')).to_numpy()
+        fig.add_trace(go.Scattergl(
+            x=_intercalar(grupo['dt_ini'].tolist(), grupo['dt_fim'].tolist()), y=_intercalar(y, y),
+            mode='lines', line=dict(color=cor, width=LARGURA_BARRA_GL), opacity=0.55,
+            name=atv, legendgroup=atv, text=_intercalar(texto, texto), hovertemplate=f"<b>{atv}</b><br>%{{text}}<extra></extra>",
+        ))
+
+        ritmo = grupo.groupby('pavimento', sort=False).agg(ini=('dt_ini', 'min'), fim=('dt_fim', 'max'))
+        ritmo['y'] = ritmo.index.map(posicao)
+        ritmo = ritmo.sort_values('y')
+        for coluna, tracado in (('ini', 'solid'), ('fim', 'dot')):
+            fig.add_trace(go.Scattergl(
+                x=ritmo[coluna], y=ritmo['y'], mode='lines+markers',
+                line=dict(color=cor, width=2, dash=tracado), marker=dict(size=5, color=cor),
+                legendgroup=atv, showlegend=False, hoverinfo='skip',
+            ))
+
+    hoje = hoje or datetime.now()
+    fig.add_vline(x=hoje, line_width=2, line_color="#E37026")
+    fig.update_layout(
+        height=max(400, 28 * len(pavs) + 120),
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white',
+        margin=dict(l=10, r=10, t=30, b=10), dragmode='pan', hovermode='closest',
+        legend=dict(orientation='h', yanchor='bottom', y=1.01, x=0),
+        yaxis=dict(tickmode='array', tickvals=list(range(len(pavs))), ticktext=pavs,
+                   range=[-0.6, len(pavs) - 0.4], gridcolor='#2a2a2a', zeroline=False),
+        xaxis=dict(type='date', gridcolor='#2a2a2a'),
+    )
+    if janela is not None:
+        fig.update_xaxes(range=[pd.Timestamp(janela[0]), pd.Timestamp(janela[1])])
+    return fig
+
+def construir_indice_lob(df):
+    # Datas lidas uma vez; uma arvore de intervalos geral e uma por pavimento. As chaves sao os rotulos de df.
+    base = df.assign(dt_ini=_datas(df['data_inicio']), dt_fim=_datas(df['data_fim'])).dropna(subset=['dt_ini', 'dt_fim'])
+    fins = base[['dt_ini', 'dt_fim']].max(axis=1)  # fim antes do inicio vira intervalo de um dia
+    itens = list(zip(base['dt_ini'].tolist(), fins.tolist(), base.index.tolist()))
+    por_pavimento = {
+        pav: intervalos.ArvoreIntervalos([itens[i] for i in posicoes])
+        for pav, posicoes in base.groupby('pavimento', sort=False).indices.items()
+    }
+    return {"df": base, "todos": intervalos.ArvoreIntervalos(itens), "por_pavimento": por_pavimento}
+
+def consultar_indice_lob(indice, janela=None, pavimentos=None):
+    # Linhas que cruzam a janela (ou todas), opcionalmente so dos pavimentos informados
+    df = indice["df"]
+    if janela is None:
+        return df if pavimentos is None else df[df['pavimento'].isin(pavimentos)]
+    ini, fim = pd.Timestamp(janela[0]), pd.Timestamp(janela[1])
+    if pavimentos is None:
+        chaves = indice["todos"].consultar(ini, fim)
+    else:
+        arvores = indice["por_pavimento"]
+        chaves = [c for pav in pavimentos if pav in arvores for c in arvores[pav].consultar(ini, fim)]
+    return df.loc[chaves]
+
+def obter_indice_lob(obra_id, df):
+    # Um indice por obra na sessao. Toda escrita troca o objeto do frame, entao o indice e refeito
+    # quando df nao e mais o mesmo; invalidar_indice_lob forca a reconstrucao.
+    if '_indice_lob' not in st.session_state:
+        st.session_state['_indice_lob'] = {}
+    cache = st.session_state['_indice_lob']
+    item = cache.get(obra_id)
+    if item is None or item["fonte"] is not df:
+        item = {"fonte": df, "indice": construir_indice_lob(df)}
+        cache[obra_id] = item
+    return item["indice"]
+
+def invalidar_indice_lob(obra_id):
+    if '_indice_lob' in st.session_state:
+        st.session_state['_indice_lob'].pop(obra_id, None)
+
+def controles_janela(df):
+    # Janela de datas (centro +- meses, com botoes para deslocar) e faixa de pavimentos.
+    # Devolve (janela ou None para o cronograma inteiro, pavimentos escolhidos ou None para todos).
+    if 'lob_centro' not in st.session_state:
+        st.session_state['lob_centro'] = datetime.now().date()
+
+    c_modo, c_meses, c_pav = st.columns([1.2, 1, 3])
+    modo = c_modo.radio("Exibir", ["Janela", "Cronograma inteiro"], horizontal=True, key="lob_modo")
+    meses = c_meses.selectbox("Meses (+/-)", [1, 2, 3, 6, 12], index=2, key="lob_meses", disabled=modo != "Janela")
+
+    pavimentos = None
+    pavs = df[['pavimento', 'ordem_pav']].drop_duplicates('pavimento').sort_values('ordem_pav')['pavimento'].tolist()
+    if len(pavs) > 1:
+        pav_ini, pav_fim = c_pav.select_slider("Pavimentos", options=pavs, value=(pavs[0], pavs[-1]), key="lob_pavs")
+        i, j = pavs.index(pav_ini), pavs.index(pav_fim)
+        if (i, j) != (0, len(pavs) - 1):
+            pavimentos = pavs[i:j + 1]
+
+    if modo != "Janela":
+        return None, pavimentos
+
+    c_ant, c_hoje, c_prox, c_info = st.columns([1, 1, 1, 4])
+    passo = pd.DateOffset(months=PASSO_PAN_MESES)
+    if c_ant.button("◀", key="lob_pan_ant", use_container_width=True):
+        st.session_state['lob_centro'] = (pd.Timestamp(st.session_state['lob_centro']) - passo).date()
+    if c_hoje.button("Hoje", key="lob_pan_hoje", use_container_width=True):
+        st.session_state['lob_centro'] = datetime.now().date()
+    if c_prox.button("▶", key="lob_pan_prox", use_container_width=True):
+        st.session_state['lob_centro'] = (pd.Timestamp(st.session_state['lob_centro']) + passo).date()
+
+    janela = janela_em_torno(st.session_state['lob_centro'], meses)
+    c_info.caption(f"{janela[0].strftime('%d/%m/%Y')} a {janela[1].strftime('%d/%m/%Y')}")
+    return janela, pavimentos
+
+def render_custom_lob(obra_id, df):
+    if df.empty:
+        st.info("Sem dados para exibir.")
         return
 
-    min_date = df['dt_ini'].min() - timedelta(days=2)
-    max_date = df['dt_fim'].max() + timedelta(days=5)
-    total_days = (max_date - min_date).days
-    if total_days < 1: total_days = 1
+    indice = obter_indice_lob(obra_id, df)
+    grafico = st.radio("Gráfico", ["Gantt", "Linha de Balanço (WebGL)"], horizontal=True, key="lob_grafico")
+    janela, pavimentos = controles_janela(indice["df"])
+    n_hoje = len(indice["todos"].ativos_em(pd.Timestamp.now().normalize()))
+    st.caption(f"{n_hoje} atividade(s) em execução hoje")
+
+    if grafico != "Gantt":
+        # Tudo dos pavimentos escolhidos vai para o grafico; a janela so define o zoom inicial e o pan e no navegador
+        fig = figura_lob(consultar_indice_lob(indice, None, pavimentos), janela)
+        if fig is None:
+            st.warning("Datas invalidas.")
+        else:
+            st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
+        return
 
-    pavimentos_ordem = df[['pavimento', 'ordem_pav']].drop_duplicates().sort_values('ordem_pav', ascending=False)
-    
-    colors = [
-        "#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6", 
-        "#EC4899", "#6366F1", "#14B8A6", "#F97316"
-    ]
-    atv_unique = df['atividade_nome'].unique()
-    map_colors = {atv: colors[i % len(colors)] for i, atv in enumerate(atv_unique)}
+    html_out, map_colors = montar_html_lob(consultar_indice_lob(indice, janela, pavimentos), janela=janela)
+    if html_out is None:
+        if janela is not None:
+            st.info("Nenhuma atividade nesta janela. Use as setas para navegar.")
+        else:
+            st.warning("Datas invalidas.")
+        return
 
     st.markdown("""
     <style>
@@ -163,79 +427,6 @@ def render_custom_lob(df):
     </style>
     """, unsafe_allow_html=True)
 
-    html_out = '<div class="gantt-scroll">'
-    
-    html_out += '<div class="gantt-header">'
-    html_out += '<div class="header-spacer">PAVIMENTO</div>'
-    html_out += '<div class="header-timeline">'
-    
-    curr = min_date.replace(day=1)
-    while curr <= max_date:
-        offset = (curr - min_date).days
-        left_pct = (offset / total_days) * 100
-        if 0 <= left_pct <= 100:
-            label = curr.strftime('%b/%y').upper()
-            html_out += f'<div class="month-marker" style="left: {left_pct}%;">{label}</div>'
-        
-        if curr.month == 12: curr = curr.replace(year=curr.year+1, month=1)
-        else: curr = curr.replace(month=curr.month+1)
-        
-    hoje = datetime.now()
-    if min_date <= hoje <= max_date:
-        hoje_pos = ((hoje - min_date).days / total_days) * 100
-        html_out += f'<div class="today-line" style="left: {hoje_pos}%;"></div>'
-
-    html_out += '</div></div>'
-
-    for _, pav_row in pavimentos_ordem.iterrows():
-        pav_nome = pav_row['pavimento']
-        atvs = df[df['pavimento'] == pav_nome].sort_values('dt_ini')
-        
-        lanes = [] 
-        
-        bars_html = ""
-        for _, row in atvs.iterrows():
-            lane_idx = -1
-            for i, end_date in enumerate(lanes):
-                if row['dt_ini'] >= end_date:
-                    lane_idx = i
-                    lanes[i] = row['dt_fim']
-                    break
-            
-            if lane_idx == -1:
-                lanes.append(row['dt_fim'])
-                lane_idx = len(lanes) - 1
-            
-            start_pct = ((row['dt_ini'] - min_date).days / total_days) * 100
-            dur_days = (row['dt_fim'] - row['dt_ini']).days
-            width_pct = (max(1, dur_days) / total_days) * 100
-            
-            top_px = 10 + (lane_idx * 30)
-            color = map_colors.get(row['atividade_nome'], "#666")
-            
-            tooltip_txt = f"{row['atividade_nome']} &#10;Inicio: {row['dt_ini'].strftime('%d/%m')} &#10;Fim: {row['dt_fim'].strftime('%d/%m')}"
-            
-            bars_html += f'<div class="gantt-bar" title="{tooltip_txt}" style="left: {start_pct}%; width: {width_pct}%; top: {top_px}px; background-color: {color};">{row["atividade_nome"]}</div>'
-        
-        row_height = max(50, (len(lanes) * 30) + 20)
-        
-        html_out += f'<div class="gantt-row" style="height: {row_height}px;">'
-        html_out += f'<div class="row-label">{pav_nome}</div>'
-        html_out += '<div class="row-track">'
-        
-        curr_g = min_date.replace(day=1)
-        while curr_g <= max_date:
-            offset = (curr_g - min_date).days
-            left_pct = (offset / total_days) * 100
-            if 0 <= left_pct <= 100:
-                html_out += f'<div class="grid-guide" style="left: {left_pct}%;"></div>'
-            if curr_g.month == 12: curr_g = curr_g.replace(year=curr_g.year+1, month=1)
-            else: curr_g = curr_g.replace(month=curr_g.month+1)
-            
-        html_out += bars_html
-        html_out += '</div></div>'
-
-    html_out += '</div>'
     st.markdown(html_out, unsafe_allow_html=True)
     
     st.markdown("**Legenda de Atividades:**")
@@ -244,6 +435,32 @@ def render_custom_lob(df):
         with cols[i % 6]:
             st.markdown(f"<div style='display:flex;align-items:center;gap:5px'><div style='width:12px;height:12px;background:{clr};border-radius:2px'></div><span>{atv}</span></div>", unsafe_allow_html=True)
 
+def _consulta_gerenciamento(supabase, obra_id, locais_ids, atividades, colunas="*", **kwargs):
+    # Le da view com a ordem do pavimento (sql/pcp_lob_atividades_ordenadas.sql); escritas seguem na tabela
+    q = supabase.table(VIEW_LOB_ORDENADA).select(colunas, **kwargs).eq("obra_id", obra_id)
+    if locais_ids:
+        q = q.in_("local_id", locais_ids)
+    if atividades:
+        q = q.in_("atividade_nome", atividades)
+    return q
+
+def contar_gerenciamento(supabase, obra_id, locais_ids, atividades):
+    q = _consulta_gerenciamento(supabase, obra_id, locais_ids, atividades, "id", count="exact")
+    return database.run_query(q.limit(1)).count or 0
+
+def buscar_pagina_gerenciamento(supabase, obra_id, locais_ids, atividades, cursor, limite=ITENS_POR_PAGINA):
+    # Uma consulta por pagina: keyset em (ordem_pav, data_ordem, id) a partir do cursor da ultima linha
+    # da pagina anterior. locais_ids vazio/None = todos os pavimentos.
+    q = _consulta_gerenciamento(supabase, obra_id, locais_ids, atividades)
+    if cursor:
+        ordem, data, ultimo_id = cursor
+        q = q.or_(
+            f'ordem_pav.gt.{ordem},'
+            f'and(ordem_pav.eq.{ordem},data_ordem.gt."{data}"),'
+            f'and(ordem_pav.eq.{ordem},data_ordem.eq."{data}",id.gt.{ultimo_id})'
+        )
+    return database.run_query(q.order("ordem_pav").order("data_ordem").order("id").limit(limite)).data or []
+
 def render_management_tab(supabase, obra_id):
     st.markdown("""
     <style>
@@ -278,64 +495,53 @@ def render_management_tab(supabase, obra_id):
     st.markdown("##### Filtros de Busca")
     c1, c2 = st.columns(2)
     
-    locais_disponiveis = []
+    locais = []
     atividades_disponiveis = []
     try:
-        r_loc = supabase.table("pcp_locais").select("nome").eq("obra_id", obra_id).order("ordem").execute()
-        locais_disponiveis = [l['nome'] for l in r_loc.data]
-        
-        r_atv = supabase.table("pcp_lob_atividades").select("atividade_nome").eq("obra_id", obra_id).execute()
-        atividades_disponiveis = sorted(list(set([a['atividade_nome'] for a in r_atv.data])))
+        locais = database.get_locais(obra_id)
+        df_obra = frames.obter(chave_lob(obra_id))
+        if df_obra is not None and not df_obra.empty:
+            atividades_disponiveis = sorted(df_obra['atividade_nome'].unique())
+        else:
+            r_atv = database.run_query(supabase.table("pcp_lob_atividades").select("atividade_nome").eq("obra_id", obra_id))
+            atividades_disponiveis = sorted({a['atividade_nome'] for a in r_atv.data if a['atividade_nome']})
     except: pass
 
-    filtro_pav = c1.multiselect("Filtrar por Pavimento", locais_disponiveis)
+    filtro_pav = c1.multiselect("Filtrar por Pavimento", [l['nome'] for l in locais])
     filtro_atv = c2.multiselect("Filtrar por Atividade", atividades_disponiveis)
     
     st.markdown("---")
 
-    query = supabase.table("pcp_lob_atividades").select("*, pcp_locais(nome, ordem)").eq("obra_id", obra_id)
-    
-    response = query.execute()
-    if not response.data:
-        st.info("Nenhuma atividade encontrada.")
-        return
+    # Sem filtro de pavimento entram tambem as atividades sem local (aparecem antes, como N/A)
+    locais_ids = [l['id'] for l in locais if l['nome'] in filtro_pav] if filtro_pav else None
+    nomes_locais = {l['id']: l['nome'] for l in locais}
 
-    df = pd.DataFrame(response.data)
-    df['pavimento'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
-    df['ordem_pav'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
-    df['atividade_nome'] = df['atividade_nome'].fillna("Sem Nome")
-    df['dt_ini'] = df['data_inicio'].apply(safe_date)
-    df['dt_fim'] = df['data_fim'].apply(safe_date)
-    
-    if filtro_pav:
-        df = df[df['pavimento'].isin(filtro_pav)]
-    if filtro_atv:
-        df = df[df['atividade_nome'].isin(filtro_atv)]
-    
-    df = df.sort_values(by=['ordem_pav', 'dt_ini'], ascending=[True, True])
-
-    if df.empty:
-        st.warning("Nenhum resultado para os filtros selecionados.")
+    total = contar_gerenciamento(supabase, obra_id, locais_ids, filtro_atv)
+    if total == 0:
+        st.info("Nenhuma atividade encontrada." if not (filtro_pav or filtro_atv) else "Nenhum resultado para os filtros selecionados.")
         return
 
-    st.markdown(f"**Encontrados: {len(df)} atividades**")
+    st.markdown(f"**Encontrados: {total} atividades**")
 
-    items_per_page = 20
-    if 'manage_page' not in st.session_state: st.session_state.manage_page = 0
-    
-    total_pages = max(1, len(df) // items_per_page + 1)
-    
-    start_idx = st.session_state.manage_page * items_per_page
-    end_idx = start_idx + items_per_page
-    df_page = df.iloc[start_idx:end_idx]
+    # Pilha de cursores: o topo e o inicio da pagina atual. Mudou o filtro, volta para a primeira pagina.
+    assinatura = (obra_id, tuple(filtro_pav), tuple(filtro_atv))
+    if st.session_state.get('lob_ger_filtro') != assinatura:
+        st.session_state['lob_ger_filtro'] = assinatura
+        st.session_state['lob_ger_cursores'] = [None]
+    cursores = st.session_state['lob_ger_cursores']
+    pagina = len(cursores) - 1
+    total_pages = max(1, math.ceil(total / ITENS_POR_PAGINA))
 
-    for i, row in df_page.iterrows():
+    linhas = buscar_pagina_gerenciamento(supabase, obra_id, locais_ids, filtro_atv, cursores[-1])
+
+    for row in linhas:
+        pavimento = nomes_locais.get(row.get('local_id'), "N/A")
         st.markdown(f"""
         <div class="manage-card">
             <div class="mc-header">
                 <div>
-                    <div class="mc-title">{row['atividade_nome']}</div>
-                    <div class="mc-sub">{row['pavimento']}</div>
+                    <div class="mc-title">{row['atividade_nome'] or "Sem Nome"}</div>
+                    <div class="mc-sub">{pavimento}</div>
                 </div>
                 <div class="mc-id">ID: {row['id']}</div>
             </div>
@@ -345,41 +551,46 @@ def render_management_tab(supabase, obra_id):
         c_in1, c_in2, c_btn1, c_btn2 = st.columns([1.5, 1.5, 0.8, 0.8])
         
         with c_in1:
-            new_ini = st.date_input("Inicio", value=row['dt_ini'], key=f"ini_{row['id']}", label_visibility="collapsed")
+            new_ini = st.date_input("Inicio", value=safe_date(row['data_inicio']), key=f"ini_{row['id']}", label_visibility="collapsed")
         with c_in2:
-            new_fim = st.date_input("Fim", value=row['dt_fim'], key=f"fim_{row['id']}", label_visibility="collapsed")
+            new_fim = st.date_input("Fim", value=safe_date(row['data_fim']), key=f"fim_{row['id']}", label_visibility="collapsed")
             
         with c_btn1:
             if st.button("Salvar", key=f"save_{row['id']}", use_container_width=True):
                 if new_fim < new_ini:
                     st.error("Data final menor que inicial!")
                 else:
-                    supabase.table("pcp_lob_atividades").update({
+                    frames.atualizar(chave_lob(obra_id), "pcp_lob_atividades", row['id'], {
                         "data_inicio": new_ini.strftime("%Y-%m-%d"),
                         "data_fim": new_fim.strftime("%Y-%m-%d")
-                    }).eq("id", row['id']).execute()
+                    }, supabase)
+                    invalidar_indice_lob(obra_id)
                     st.toast("Salvo com sucesso!")
                     time.sleep(0.5)
                     st.rerun()
                     
         with c_btn2:
             if st.button("Excluir", key=f"del_{row['id']}", type="primary", use_container_width=True):
-                supabase.table("pcp_lob_atividades").delete().eq("id", row['id']).execute()
+                frames.excluir(chave_lob(obra_id), "pcp_lob_atividades", row['id'], supabase)
+                invalidar_indice_lob(obra_id)
                 st.toast("Atividade excluida!")
                 time.sleep(0.5)
                 st.rerun()
                 
         st.markdown("<div style='margin-bottom:15px'></div>", unsafe_allow_html=True)
 
+    tem_proxima = bool(linhas) and pagina * ITENS_POR_PAGINA + len(linhas) < total
+
     c_p1, c_p2, c_p3 = st.columns([1, 5, 1])
-    if c_p1.button("Anterior", disabled=(st.session_state.manage_page == 0), use_container_width=True):
-        st.session_state.manage_page -= 1
+    if c_p1.button("Anterior", disabled=(pagina == 0), use_container_width=True):
+        cursores.pop()
         st.rerun()
     
-    c_p2.markdown(f"<div style='text-align:center; padding-top:10px'>Pagina {st.session_state.manage_page + 1} de {total_pages}</div>", unsafe_allow_html=True)
+    c_p2.markdown(f"<div style='text-align:center; padding-top:10px'>Pagina {pagina + 1} de {total_pages}</div>", unsafe_allow_html=True)
     
-    if c_p3.button("Proxima", disabled=(end_idx >= len(df)), use_container_width=True):
-        st.session_state.manage_page += 1
+    if c_p3.button("Proxima", disabled=not tem_proxima, use_container_width=True):
+        ultima = linhas[-1]
+        cursores.append((ultima['ordem_pav'], ultima['data_ordem'], ultima['id']))
         st.rerun()
 
 def app(obra_id):
@@ -400,26 +611,18 @@ def app(obra_id):
             with st.expander("Nova Atividade", expanded=False):
                 locais = []
                 try:
-                    r_loc = supabase.table("pcp_locais").select("id, nome").eq("obra_id", obra_id).order("ordem").execute()
-                    locais = r_loc.data
+                    locais = database.get_locais(obra_id)
                 except: pass
                 
                 atividades_padrao = []
                 try:
-                    r_atv = supabase.table("pcp_atividades_padrao").select("atividade").execute()
-                    atividades_padrao = [a['atividade'] for a in r_atv.data]
+                    atividades_padrao = [a['atividade'] for a in database.get_atividades_padrao()]
                 except: pass
 
                 with st.form("form_lob_quick"):
                     c_form = st.container()
                     usar_texto = c_form.toggle("Digitar nova atividade?", key="new_pp_tgg")
 
-                    atividades_padrao = []
-                    try:
-                        r = supabase.table("pcp_atividades_padrao").select("atividade").execute()
-                        atividades_padrao = [a['atividade'] for a in r.data]
-                    except: pass
-
                     if usar_texto:
                         atv = c_form.text_input("Nome da Atividade")
                     else:
@@ -442,21 +645,18 @@ def app(obra_id):
                                     "obra_id": obra_id, "local_id": map_ids[nome_loc], "atividade_nome": atv,
                                     "data_inicio": str_ini, "data_fim": str_fim, "status": "Planejado"
                                 })
-                            supabase.table("pcp_lob_atividades").insert(inserts).execute()
+                            frames.inserir(chave_lob(obra_id), "pcp_lob_atividades", inserts, supabase)
+                            invalidar_indice_lob(obra_id)
                             st.success("Salvo!")
                             time.sleep(1)
                             st.rerun()
 
         try:
-            response = supabase.table("pcp_lob_atividades").select("*, pcp_locais(nome, ordem)").eq("obra_id", obra_id).execute()
-            if not response.data:
+            df = carregar_lob(supabase, obra_id)
+            if df.empty:
                 st.info("Cronograma vazio.")
             else:
-                df = pd.DataFrame(response.data)
-                df['pavimento'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
-                df['ordem_pav'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
-                df['atividade_nome'] = df['atividade_nome'].fillna("Sem Nome")
-                render_custom_lob(df)
+                render_custom_lob(obra_id, df)
         except Exception as e:
             st.error(f"Erro: {e}")
 
@@ -471,14 +671,18 @@ def app(obra_id):
                 ordem = c2.number_input("Ordem", value=0)
                 if st.form_submit_button("Salvar Pavimento"):
                     supabase.table("pcp_locais").insert({"obra_id": obra_id, "nome": nome, "ordem": ordem, "tipo": "Pavimento"}).execute()
+                    database.clear_reference_cache("pcp_locais")
+                    frames.invalidar()
                     st.rerun()
             
-            res = supabase.table("pcp_locais").select("*").eq("obra_id", obra_id).order("ordem").execute()
-            if res.data:
+            locais_obra = database.get_locais(obra_id)
+            if locais_obra:
                 st.markdown("---")
-                for l in res.data:
+                for l in locais_obra:
                     c1, c2 = st.columns([4,1])
                     c1.text(f"{l['ordem']} - {l['nome']}")
                     if c2.button("Excluir", key=f"del_lob_{l['id']}"):
                         supabase.table("pcp_locais").delete().eq("id", l['id']).execute()
+                        database.clear_reference_cache("pcp_locais")
+                        frames.invalidar()
                         st.rerun()
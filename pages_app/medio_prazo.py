@@ -3,22 +3,43 @@ import pandas as pd
 from datetime import datetime, timedelta
 import time
 from modules import database
+from modules import frames
 from modules import ui
 
-def update_status(id, new_status):
+def chave_medio_prazo(obra_id):
+    return f"medio_prazo_{obra_id}"
+
+def carregar_medio_prazo(supabase, obra_id):
+    embed = frames.embed_locais(obra_id)
+    def preparar(df):
+        df = embed(df)
+        if df.empty:
+            return df
+        if 'pcp_locais' in df.columns:
+            df['local_nome'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else 'Geral')
+        else:
+            df['local_nome'] = "Local nao definido"
+        return df
+    return frames.carregar(
+        chave_medio_prazo(obra_id),
+        lambda: supabase.table("pcp_medio_prazo").select("*").eq("obra_id", obra_id).execute().data,
+        preparar,
+    )
+
+def update_status(chave, id, new_status):
     supabase = database.get_db_client()
     try:
-        supabase.table("pcp_medio_prazo").update({"status_liberacao": new_status}).eq("id", id).execute()
+        frames.atualizar(chave, "pcp_medio_prazo", id, {"status_liberacao": new_status}, supabase)
         st.toast(f"Status alterado para {new_status}", icon="🔄")
         time.sleep(0.5)
         st.rerun()
     except Exception as e:
         st.error(f"Erro ao atualizar: {e}")
 
-def delete_package(id):
+def delete_package(chave, id):
     supabase = database.get_db_client()
     try:
-        supabase.table("pcp_medio_prazo").delete().eq("id", id).execute()
+        frames.excluir(chave, "pcp_medio_prazo", id, supabase)
         st.rerun()
     except Exception as e:
         st.error(f"Erro ao excluir: {e}")
@@ -125,14 +146,12 @@ def app(obra_id):
         with st.expander("Nova Atividade", expanded=False):
             locais = {}
             try:
-                r_loc = supabase.table("pcp_locais").select("id, nome").eq("obra_id", obra_id).order("ordem").execute()
-                locais = {l['nome']: l['id'] for l in r_loc.data}
+                locais = {l['nome']: l['id'] for l in database.get_locais(obra_id)}
             except: pass
             
             atividades = []
             try:
-                r_atv = supabase.table("pcp_atividades_padrao").select("atividade").order("atividade").execute()
-                atividades = [a['atividade'] for a in r_atv.data]
+                atividades = [a['atividade'] for a in database.get_atividades_padrao()]
             except: pass
             
             hoje = datetime.now()
@@ -152,12 +171,7 @@ def app(obra_id):
                     if usar_texto:
                         atv_sel = st.text_input("Nome da Atividade", placeholder="Digite aqui...")
                     else:
-                        atividades_padrao = []
-                        try:
-                            r = supabase.table("pcp_atividades_padrao").select("atividade").execute()
-                            atividades_padrao = [a['atividade'] for a in r.data]
-                        except: pass
-                        atv_sel = st.selectbox("Selecionar Atividade", atividades_padrao) if atividades_padrao else st.text_input("Atividade")
+                        atv_sel = st.selectbox("Selecionar Atividade", atividades) if atividades else st.text_input("Atividade")
                 semana_sel = c2.selectbox("Semana", lista_semanas)
                 
                 
@@ -175,24 +189,18 @@ def app(obra_id):
                         "responsavel_execucao": resp_input.upper(),
                         "status_liberacao": "Liberado"
                     }
-                    supabase.table("pcp_medio_prazo").insert(payload).execute()
+                    frames.inserir(chave_medio_prazo(obra_id), "pcp_medio_prazo", payload, supabase)
                     st.success("Pacote criado!")
                     time.sleep(0.5)
                     st.rerun()
         st.markdown("---")
     try:
-        response = supabase.table("pcp_medio_prazo").select("*, pcp_locais(nome)").eq("obra_id", obra_id).execute()
-        df = pd.DataFrame(response.data)
+        df = carregar_medio_prazo(supabase, obra_id)
         
         if df.empty:
             st.info("Nenhum pacote cadastrado para o medio prazo.")
             return
 
-        if 'pcp_locais' in df.columns:
-            df['local_nome'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else 'Geral')
-        else:
-            df['local_nome'] = "Local nao definido"
-
         semanas_ordenadas = sorted(df['semana_ref'].unique())
 
         for semana in semanas_ordenadas:
@@ -223,7 +231,7 @@ def app(obra_id):
                     
                     if is_admin:
                         if st.button("Excluir", key=f"del_{row['id']}", use_container_width=True):
-                            delete_package(row['id'])
+                            delete_package(chave_medio_prazo(obra_id), row['id'])
                     else:
                          st.button("Excluir", key=f"del_{row['id']}", disabled=True, use_container_width=True)
 
@@ -3,17 +3,39 @@ import pandas as pd
 from datetime import datetime, timedelta
 import time
 from modules import database
+from modules import fechamento
+from modules import frames
+from modules import indicadores
 from modules import ui
 import json
 import math
 
-def update_record(id, field, value):
+def update_record(chave_df, id, field, value):
+    # Vai para a fila write-behind; o envio acontece ao salvar, ao trocar de pagina ou apos frames.FILA_JANELA
+    if not frames.pendentes(chave_df):
+        # Fila saindo de vazia: o card pede uma rerun completa para o monitor ganhar run_every
+        st.session_state[f"fila_iniciada_{chave_df}"] = True
+    frames.enfileirar(chave_df, "pcp_programacao_semanal", id, {field: value})
+    st.session_state[f"kpi_pendente_{chave_df}"] = True
+
+def on_change_dia(chave_df, id, field, key):
+    update_record(chave_df, id, field, st.session_state[key])
+
+def monitor_fila(chave_df, periodico=False):
+    # Fragmento com run_every so enquanto ha fila (ver app); tambem mostra erros de envio
     supabase = database.get_db_client()
-    try:
-        supabase.table("pcp_programacao_semanal").update({field: value}).eq("id", id).execute()
-        st.toast("Salvo!", icon="✅")
-    except Exception as e:
-        st.error(f"Erro ao salvar: {e}")
+    frames.descarregar_vencidos(supabase)
+    erros = frames.erros_fila(chave_df)
+    if periodico and not erros and not frames.pendentes(chave_df):
+        # Fila enviada: rerun completa para desligar o run_every e mostrar os dados reconciliados
+        st.rerun()
+    if erros:
+        st.error("Falha ao enviar alterações: " + "; ".join(erros))
+        if st.button("Tentar novamente", key=f"fila_retry_{chave_df}"):
+            frames.descarregar(supabase, chave_df)
+            st.rerun(scope="fragment")
+    elif frames.pendentes(chave_df):
+        st.caption(f"{frames.pendentes(chave_df)} atividade(s) com alterações aguardando envio...")
 
 def get_month_name(dt):
     meses = {
@@ -29,6 +51,371 @@ def get_week_label(dt):
     week_num = (adjusted_day - 1) // 7 + 1
     return f"SEMANA {week_num}"
 
+@st.dialog("Editar Atividade")
+def dialog_editar_atividade(chave_df, row_data, locais_disp, ativ_disp):
+    supabase = database.get_db_client()
+    st.write("Altere as informações da atividade:")
+
+    if locais_disp:
+        idx_l = locais_disp.index(row_data['local']) if row_data['local'] in locais_disp else 0
+        val_local = st.selectbox("Local", locais_disp, index=idx_l, key=f"ed_loc_{row_data['id']}")
+    else:
+        val_local = st.text_input("Local", value=row_data['local'], key=f"ed_loc_{row_data['id']}")
+
+    if ativ_disp:
+        idx_a = ativ_disp.index(row_data['atividade']) if row_data['atividade'] in ativ_disp else 0
+        val_ativ = st.selectbox("Atividade", ativ_disp, index=idx_a, key=f"ed_atv_{row_data['id']}")
+    else:
+        val_ativ = st.text_input("Atividade", value=row_data['atividade'], key=f"ed_atv_{row_data['id']}")
+
+    val_detalhe = st.text_input("Detalhe / Recurso", value=row_data['detalhe'] if pd.notna(row_data['detalhe']) else "", key=f"ed_det_{row_data['id']}")
+    val_equipe = st.text_input("Equipe / Encarregado", value=row_data['encarregado'] if pd.notna(row_data['encarregado']) else "", key=f"ed_eq_{row_data['id']}")
+
+    st.markdown("---")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        if st.button("Salvar", use_container_width=True):
+            dados_update = {
+                "local": str(val_local).upper(),
+                "atividade": str(val_ativ).upper(),
+                "detalhe": str(val_detalhe).upper(),
+                "encarregado": str(val_equipe).upper()
+            }
+            if frames.atualizar_alterados(chave_df, "pcp_programacao_semanal", row_data['id'], row_data, dados_update, supabase):
+                st.toast("Atividade atualizada!", icon="✅")
+                time.sleep(0.5)
+                st.rerun()
+            else:
+                st.toast("Nenhuma alteração para salvar.")
+
+    with c2:
+        if st.button("Excluir", type="primary", use_container_width=True):
+            frames.excluir(chave_df, "pcp_programacao_semanal", row_data['id'], supabase)
+            st.toast("Atividade excluída!", icon="🗑️")
+            time.sleep(0.5)
+            st.rerun()
+
+def preparar_semana(df):
+    # feito_* nulo no banco aparece desmarcado; guardar como False evita contar como alteracao
+    for dia in DIAS_GRADE:
+        if f"feito_{dia}" in df.columns:
+            df[f"feito_{dia}"] = df[f"feito_{dia}"].isin([True])
+    return df
+
+def chave_df_semana(obra_id, start_week):
+    return f"prog_semanal_df_{obra_id}_{start_week.strftime('%Y-%m-%d')}"
+
+def render_kpis(slot, df):
+    total_atividades = 0
+    total_concluidas = 0
+    ppc_percent = 0.0
+    pap_percent = 0.0
+
+    if not df.empty and 'status' in df.columns:
+        kpis = indicadores.resumo(df)
+        total_atividades = kpis['atividades']
+        total_concluidas = kpis['concluidas']
+        ppc_percent = kpis['ppc']
+        pap_percent = kpis['pap']
+
+    slot.markdown(f"""
+    <div class="kpi-container">
+        <div class="kpi-card" style="border-bottom: 3px solid #E37026;">
+            <div class="kpi-title">Total Atividades</div>
+            <div class="kpi-value">{total_atividades}</div>
+            <div class="kpi-sub">{total_concluidas} Concluidas</div>
+        </div>
+        <div class="kpi-card" style="border-bottom: 3px solid #3B82F6;">
+            <div class="kpi-title">PPC (Semanal)</div>
+            <div class="kpi-value">{ppc_percent:.1f}%</div>
+            <div class="kpi-sub">Conclusao Status</div>
+        </div>
+        <div class="kpi-card" style="border-bottom: 3px solid #4ADE80;">
+            <div class="kpi-title">PAP (Diario)</div>
+            <div class="kpi-value">{pap_percent:.1f}%</div>
+            <div class="kpi-sub">Aderencia Dias</div>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+    return total_atividades, ppc_percent, pap_percent
+
+@st.fragment
+def card_atividade(chave_df, row_id, lista_problemas, lista_locais, lista_atividades, kpi_slot):
+    # Salvar reexecuta so este card e redesenha os KPIs no slot; o resto da pagina nao roda de novo
+    df = frames.obter(chave_df)
+    if df is None:
+        return
+    linhas = df[df['id'] == row_id]
+    if linhas.empty:
+        return
+    row = linhas.iloc[0]
+    supabase = database.get_db_client()
+    if st.session_state.pop(f"fila_iniciada_{chave_df}", False):
+        # O monitor so tem run_every se a fila ja existia na ultima rerun completa
+        st.rerun()
+    frames.descarregar_vencidos(supabase)
+    if st.session_state.pop(f"kpi_pendente_{chave_df}", False):
+        render_kpis(kpi_slot, df)
+
+    status_color = "#888" 
+    if row['status'] == 'Concluido': status_color = "#4ADE80" 
+    elif row['status'] == 'Nao Concluido': status_color = "#EF4444" 
+    elif row['status'] == 'Em Andamento': status_color = "#E37026" 
+
+    st.markdown(f"""
+    <div class="task-card" style="border-left-color: {status_color};">
+        <div class="card-sub-text">{row['local']}</div>
+        <span class="status-badge" style="color:{status_color};  border: 1px solid {status_color};">{row['status']}</span>
+        <div class="card-header-text">{row['atividade']}</div>
+        <div style="font-size: 0.8rem; color: #ccc; margin-bottom: 10px;">
+            {row['detalhe'] or ''} <span style="color: #666">|</span> {row['encarregado'] or 'S/ Equipe'}
+        </div>
+    """, unsafe_allow_html=True)
+
+    opcoes_status = ["A Iniciar", "Em Andamento", "Concluido", "Nao Concluido"]
+    idx_status = 0
+    if row['status'] in opcoes_status:
+        idx_status = opcoes_status.index(row['status'])
+
+    new_status = st.selectbox(
+        "Status", 
+        opcoes_status,
+        index=idx_status,
+        key=f"st_{row['id']}",
+        label_visibility="collapsed"
+    )
+
+    selected_causa = row.get('causa') 
+
+    if new_status == "Em Andamento":
+        db_perc = row.get('percentual', 0)
+        if pd.isna(db_perc): db_perc = 0
+
+        st.number_input(
+            "Conclusão (%):", 
+            min_value=0, 
+            max_value=100, 
+            value=int(db_perc),
+            step=5,
+            key=f"perc_{row['id']}"
+        )
+
+    if new_status in ["Nao Concluido", "Em Andamento"]:
+        selected_causa = row.get('causa') 
+        idx_causa = None
+
+        if selected_causa and selected_causa in lista_problemas:
+            idx_causa = lista_problemas.index(selected_causa)
+
+        _causa_selecionada = st.selectbox(
+            "Motivo / Problema:",
+            lista_problemas,
+            index=idx_causa,
+            key=f"causa_{row['id']}",
+            placeholder="Selecione o problema..."
+        )
+
+    if new_status in ["Em Andamento", "Nao Concluido"]:
+        db_obs = row.get('observacao', '')
+        if pd.isna(db_obs): db_obs = ""
+
+        _obs_digitada = st.text_area(
+            "Observação:",
+            value=db_obs,
+            key=f"obs_{row['id']}",
+            height=68,
+            placeholder="Descreva detalhes..."
+        )
+
+    st.markdown('<div style="margin: 5px 0;"></div>', unsafe_allow_html=True)
+
+    d1, d2, d3, d4, d5 = st.columns(5)
+
+    def day_widget(col_obj, label, db_val_rec, db_val_chk, suffix_id):
+        with col_obj:
+            is_disabled = (db_val_rec is None or str(db_val_rec).strip() == '')
+            st.markdown(f"<div class='day-label'>{label}</div>", unsafe_allow_html=True)
+            if not is_disabled:
+                key_chk = f"chk_{label}_{suffix_id}"
+                chk = st.checkbox("ok", value=db_val_chk, key=key_chk, label_visibility="collapsed",
+                                  on_change=on_change_dia, args=(chave_df, suffix_id, f"feito_{label.lower()}", key_chk))
+                txt = st.text_area("r", value=db_val_rec, key=f"txt_{label}_{suffix_id}", label_visibility="collapsed", height=35)
+                return chk, txt
+            else:
+                st.markdown("<div style='height: 28px; background: #222; border-radius: 4px; opacity: 0.3;'></div>", unsafe_allow_html=True)
+                return False, None
+
+    chk_seg, txt_seg = day_widget(d1, "SEG", row['rec_seg'], row['feito_seg'], row['id'])
+    chk_ter, txt_ter = day_widget(d2, "TER", row['rec_ter'], row['feito_ter'], row['id'])
+    chk_qua, txt_qua = day_widget(d3, "QUA", row['rec_qua'], row['feito_qua'], row['id'])
+    chk_qui, txt_qui = day_widget(d4, "QUI", row['rec_qui'], row['feito_qui'], row['id'])
+    chk_sex, txt_sex = day_widget(d5, "SEX", row['rec_sex'], row['feito_sex'], row['id'])
+
+    st.markdown('<div style="margin-top: 5px; border-top: 1px solid #333; padding-top: 10px;">', unsafe_allow_html=True)
+
+    c_btn1, c_btn2 = st.columns([2, 1])
+
+    with c_btn1:
+        if st.button("Salvar", key=f"save_{row['id']}", use_container_width=True):
+            status_atual = st.session_state[f"st_{row['id']}"]
+            up_data = {"status": status_atual}
+
+            if txt_seg is not None: 
+                up_data["rec_seg"] = txt_seg
+                up_data["feito_seg"] = chk_seg
+            if txt_ter is not None: 
+                up_data["rec_ter"] = txt_ter
+                up_data["feito_ter"] = chk_ter
+            if txt_qua is not None: 
+                up_data["rec_qua"] = txt_qua
+                up_data["feito_qua"] = chk_qua
+            if txt_qui is not None: 
+                up_data["rec_qui"] = txt_qui
+                up_data["feito_qui"] = chk_qui
+            if txt_sex is not None: 
+                up_data["rec_sex"] = txt_sex
+                up_data["feito_sex"] = chk_sex
+
+            if status_atual in ["Nao Concluido", "Em Andamento"]:
+                causa_val = st.session_state.get(f"causa_{row['id']}")
+                up_data['causa'] = causa_val
+            else:
+                up_data['causa'] = None
+            if status_atual == "Em Andamento":
+                perc_val = st.session_state.get(f"perc_{row['id']}")
+                up_data['percentual'] = perc_val
+            elif status_atual == "Concluido":
+                up_data['percentual'] = 100
+            else:
+                up_data['percentual'] = 0
+            if status_atual in ["Em Andamento", "Nao Concluido"]:
+                obs_val = st.session_state.get(f"obs_{row['id']}")
+                up_data['observacao'] = obs_val
+            else:
+                up_data['observacao'] = None
+
+            # Junta com os cliques nos dias que ainda estao na fila: sai um unico UPDATE para a linha
+            frames.enfileirar(chave_df, "pcp_programacao_semanal", row['id'], up_data)
+            try:
+                enviados, erros = frames.descarregar(supabase, chave_df)
+                if erros:
+                    st.error("Erro: " + "; ".join(erros))
+                elif not enviados:
+                    st.toast("Nenhuma alteração para salvar.")
+                else:
+                    render_kpis(kpi_slot, frames.obter(chave_df))
+                    st.toast("Salvo!", icon="✅")
+                    st.rerun(scope="fragment")
+            except Exception as e:
+                st.error(f"Erro: {e}")
+
+    with c_btn2:
+        if st.button("Editar", key=f"edit_{row['id']}", use_container_width=True):
+            dialog_editar_atividade(chave_df, row, lista_locais, lista_atividades)
+
+DIAS_GRADE = ["seg", "ter", "qua", "qui", "sex"]
+COLUNAS_GRADE = ['local', 'atividade', 'detalhe', 'encarregado', 'status', 'percentual', 'causa', 'observacao'] + \
+    [f"{prefixo}_{dia}" for dia in DIAS_GRADE for prefixo in ("rec", "feito")]
+# UPDATE em lote so das linhas/campos alterados (sql/pcp_atualizar_programacao.sql)
+RPC_ATUALIZAR_GRADE = "pcp_atualizar_programacao"
+
+def preparar_grade(df):
+    grade = df.copy()
+    for col in ['id'] + COLUNAS_GRADE:
+        if col not in grade.columns:
+            grade[col] = None
+    for dia in DIAS_GRADE:
+        grade[f'feito_{dia}'] = grade[f'feito_{dia}'].isin([True])
+    grade['percentual'] = pd.to_numeric(grade['percentual'], errors='coerce')
+    return grade[['id'] + COLUNAS_GRADE].reset_index(drop=True)
+
+def diff_grade(original, editado, colunas=COLUNAS_GRADE):
+    # {id: {coluna: valor}} so com as linhas e colunas que mudaram
+    orig = original.set_index('id')
+    mudancas = {}
+    for row_id, linha in editado.set_index('id')[colunas].iterrows():
+        if row_id not in orig.index:
+            continue
+        alteradas = database.montar_patch(orig.loc[row_id], {c: linha[c] for c in colunas})
+        if alteradas:
+            mudancas[database.valor_json(row_id)] = alteradas
+    return mudancas
+
+def montar_lote(mudancas):
+    # Cada linha leva so os proprios campos alterados
+    return [{"id": row_id, "campos": campos} for row_id, campos in mudancas.items()]
+
+def render_grade(chave_df, lista_problemas):
+    df = frames.obter(chave_df)
+    grade = preparar_grade(df)
+
+    column_config = {
+        "id": None,
+        "local": st.column_config.TextColumn("Local"),
+        "atividade": st.column_config.TextColumn("Atividade"),
+        "detalhe": st.column_config.TextColumn("Detalhe"),
+        "encarregado": st.column_config.TextColumn("Equipe"),
+        "status": st.column_config.SelectboxColumn("Status", options=["A Iniciar", "Em Andamento", "Concluido", "Nao Concluido"], required=True),
+        "percentual": st.column_config.NumberColumn("%", min_value=0, max_value=100, step=5),
+        "causa": st.column_config.SelectboxColumn("Motivo", options=lista_problemas),
+        "observacao": st.column_config.TextColumn("Observação"),
+    }
+    for dia in DIAS_GRADE:
+        column_config[f"rec_{dia}"] = st.column_config.TextColumn(dia.upper())
+        column_config[f"feito_{dia}"] = st.column_config.CheckboxColumn("ok")
+
+    editado = st.data_editor(
+        grade,
+        column_config=column_config,
+        hide_index=True,
+        num_rows="fixed",
+        use_container_width=True,
+        key=f"grade_{chave_df}",
+    )
+
+    mudancas = diff_grade(grade, editado)
+    c_info, c_btn = st.columns([3, 1])
+    c_info.caption(f"{len(mudancas)} atividade(s) alterada(s)" if mudancas else "Nenhuma alteração pendente")
+
+    if c_btn.button("Salvar tudo", type="primary", use_container_width=True, disabled=not mudancas):
+        lote = montar_lote(mudancas)
+        try:
+            # A fila write-behind vai antes; se algo ficou nela, um envio posterior sobrescreveria a grade
+            _, erros = frames.descarregar(chave=chave_df)
+            if erros:
+                st.error("Alterações pendentes não foram enviadas, a grade não foi salva: " + "; ".join(erros))
+                return
+            rows = frames.atualizar_lote(chave_df, RPC_ATUALIZAR_GRADE, lote)
+        except Exception as e:
+            st.error(f"Erro ao salvar: {e}")
+            return
+        st.session_state.pop(f"grade_{chave_df}", None)
+        st.toast(f"{len(rows)} atividade(s) salvas!", icon="✅")
+        if len(rows) < len(lote):
+            # Excluidas por outro usuario depois do carregamento: nao sao recriadas
+            frames.recarregar(chave_df)
+            st.toast(f"{len(lote) - len(rows)} atividade(s) não existem mais e foram ignoradas.", icon="⚠️")
+        st.rerun()
+
+def render_cards(chave_df, df, lista_problemas, lista_locais, lista_atividades, kpi_slot):
+    busca_atividade = st.text_input("Filtrar Atividades", placeholder="Digite o nome da atividade para procurar...")
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    if busca_atividade:
+        df_view = df[df['atividade'].str.contains(busca_atividade, case=False, na=False)]
+    else:
+        df_view = df
+
+    if df_view.empty:
+        st.warning("Nenhuma atividade encontrada com este nome.")
+    else:
+        cols = st.columns(2)
+        
+        for i, row_id in enumerate(df_view['id']):
+            with cols[i % 2]:
+                card_atividade(chave_df, row_id, lista_problemas, lista_locais, lista_atividades, kpi_slot)
+
 def app(obra_id):
     st.markdown("""
     <style>
@@ -139,67 +526,23 @@ def app(obra_id):
 
     lista_locais = []
     try:
-        resp = supabase.table("pcp_locais").select("nome").eq("obra_id", obra_id).order("ordem").execute()
-        if resp.data: lista_locais = [l['nome'] for l in resp.data]
+        lista_locais = [l['nome'] for l in database.get_locais(obra_id)]
     except: pass
 
     lista_atividades = []
     try:
-        resp = supabase.table("pcp_atividades_padrao").select("atividade").order("atividade").execute()
-        if resp.data: lista_atividades = [a['atividade'] for a in resp.data]
+        lista_atividades = [a['atividade'] for a in database.get_atividades_padrao()]
     except: pass
 
     lista_problemas = []
     try:
-        resp = supabase.table("pcp_lista_problemas").select("*").execute()
-        if resp.data:
-            col_nome = 'descricao' if 'descricao' in resp.data[0] else 'problema'
-            lista_problemas = [p[col_nome] for p in resp.data]
+        problemas = database.get_lista_problemas()
+        if problemas:
+            col_nome = 'descricao' if 'descricao' in problemas[0] else 'problema'
+            lista_problemas = [p[col_nome] for p in problemas]
             lista_problemas.sort()
     except: pass
 
-    @st.dialog("Editar Atividade")
-    def dialog_editar_atividade(row_data, locais_disp, ativ_disp):
-        st.write("Altere as informações da atividade:")
-        
-        if locais_disp:
-            idx_l = locais_disp.index(row_data['local']) if row_data['local'] in locais_disp else 0
-            val_local = st.selectbox("Local", locais_disp, index=idx_l, key=f"ed_loc_{row_data['id']}")
-        else:
-            val_local = st.text_input("Local", value=row_data['local'], key=f"ed_loc_{row_data['id']}")
-
-        if ativ_disp:
-            idx_a = ativ_disp.index(row_data['atividade']) if row_data['atividade'] in ativ_disp else 0
-            val_ativ = st.selectbox("Atividade", ativ_disp, index=idx_a, key=f"ed_atv_{row_data['id']}")
-        else:
-            val_ativ = st.text_input("Atividade", value=row_data['atividade'], key=f"ed_atv_{row_data['id']}")
-        
-        val_detalhe = st.text_input("Detalhe / Recurso", value=row_data['detalhe'] if pd.notna(row_data['detalhe']) else "", key=f"ed_det_{row_data['id']}")
-        val_equipe = st.text_input("Equipe / Encarregado", value=row_data['encarregado'] if pd.notna(row_data['encarregado']) else "", key=f"ed_eq_{row_data['id']}")
-        
-        st.markdown("---")
-        
-        c1, c2 = st.columns(2)
-        with c1:
-            if st.button("Salvar", use_container_width=True):
-                dados_update = {
-                    "local": str(val_local).upper(),
-                    "atividade": str(val_ativ).upper(),
-                    "detalhe": str(val_detalhe).upper(),
-                    "encarregado": str(val_equipe).upper()
-                }
-                supabase.table("pcp_programacao_semanal").update(dados_update).eq("id", row_data['id']).execute()
-                st.toast("Atividade atualizada!", icon="✅")
-                time.sleep(0.5)
-                st.rerun()
-                
-        with c2:
-            if st.button("Excluir", type="primary", use_container_width=True):
-                supabase.table("pcp_programacao_semanal").delete().eq("id", row_data['id']).execute()
-                st.toast("Atividade excluída!", icon="🗑️")
-                time.sleep(0.5)
-                st.rerun()
-
     with st.expander("Nova Atividade", expanded=False):
         c_top = st.container()
 
@@ -257,7 +600,7 @@ def app(obra_id):
                     "status": "A Iniciar"
                 }
                 try:
-                    supabase.table("pcp_programacao_semanal").insert(dados).execute()
+                    frames.inserir(chave_df_semana(obra_id, start_week), "pcp_programacao_semanal", dados, supabase)
                     st.toast("Lancado com sucesso!", icon="✅")
                     time.sleep(0.5)
                     st.rerun()
@@ -266,246 +609,40 @@ def app(obra_id):
 
     st.markdown("---")
 
-    response = supabase.table("pcp_programacao_semanal").select("*")\
-        .eq("obra_id", obra_id)\
-        .eq("data_inicio_semana", start_week.strftime('%Y-%m-%d'))\
-        .order("id", desc=False).execute()
-
-    df = pd.DataFrame(response.data)
-
-    total_atividades = 0
-    total_pontos_ppc = 0 
-    total_concluidas = 0
-    total_dias_programados = 0
-    total_dias_executados = 0
-    ppc_percent = 0.0
-    pap_percent = 0.0
-
-    if not df.empty and 'status' in df.columns:
-        total_atividades = len(df)
-
-        for idx, row in df.iterrows():
-            if row['status'] == 'Concluido':
-                total_pontos_ppc += 1.0
-            elif row['status'] == 'Em Andamento':
-                perc = row.get('percentual', 0)
-                try:
-                    val_perc = float(perc) if perc else 0.0
-                except:
-                    val_perc = 0.0
-                total_pontos_ppc += (val_perc / 100.0)
-
-            for dia in ['seg', 'ter', 'qua', 'qui', 'sex']:
-                rec_val = row.get(f'rec_{dia}')
-                feito_val = row.get(f'feito_{dia}')
-
-                if rec_val and str(rec_val).strip() != '':
-                    total_dias_programados += 1
-                    if feito_val is True:
-                        total_dias_executados += 1
-
-        if total_atividades > 0:
-            ppc_percent = (total_pontos_ppc / total_atividades) * 100
-
-        if total_dias_programados > 0:
-            pap_percent = (total_dias_executados / total_dias_programados) * 100
-    else:
+    data_semana = start_week.strftime('%Y-%m-%d')
+    chave_df = chave_df_semana(obra_id, start_week)
+    df = frames.carregar(
+        chave_df,
+        lambda: supabase.table("pcp_programacao_semanal").select("*")
+            .eq("obra_id", obra_id)
+            .eq("data_inicio_semana", data_semana)
+            .order("id", desc=False).execute().data,
+        preparar_semana,
+    )
+
+    if df.empty or 'status' not in df.columns:
         df = pd.DataFrame(columns=['id', 'status', 'local', 'atividade', 'detalhe', 'encarregado', 
                                    'rec_seg', 'feito_seg', 'rec_ter', 'feito_ter', 
                                    'rec_qua', 'feito_qua', 'rec_qui', 'feito_qui', 
                                    'rec_sex', 'feito_sex', 'causa', 'percentual', 'observacao'])
 
-
-    st.markdown(f"""
-    <div class="kpi-container">
-        <div class="kpi-card" style="border-bottom: 3px solid #E37026;">
-            <div class="kpi-title">Total Atividades</div>
-            <div class="kpi-value">{total_atividades}</div>
-            <div class="kpi-sub">{total_concluidas} Concluidas</div>
-        </div>
-        <div class="kpi-card" style="border-bottom: 3px solid #3B82F6;">
-            <div class="kpi-title">PPC (Semanal)</div>
-            <div class="kpi-value">{ppc_percent:.1f}%</div>
-            <div class="kpi-sub">Conclusao Status</div>
-        </div>
-        <div class="kpi-card" style="border-bottom: 3px solid #4ADE80;">
-            <div class="kpi-title">PAP (Diario)</div>
-            <div class="kpi-value">{pap_percent:.1f}%</div>
-            <div class="kpi-sub">Aderencia Dias</div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    kpi_slot = st.empty()
+    total_atividades, _, _ = render_kpis(kpi_slot, df)
+    # Rerun completa: o monitor abaixo ja enxerga a fila, os cards nao precisam pedir outra
+    st.session_state.pop(f"fila_iniciada_{chave_df}", None)
+    intervalo_fila = frames.FILA_JANELA if frames.pendentes(chave_df) else None
+    st.fragment(monitor_fila, run_every=intervalo_fila)(chave_df, periodico=intervalo_fila is not None)
 
     if df.empty or total_atividades == 0:
         st.info("Nenhuma atividade programada para esta semana.")
         return
 
     st.markdown("#### Lista de Atividades")
-    busca_atividade = st.text_input("Filtrar Atividades", placeholder="Digite o nome da atividade para procurar...")
-    st.markdown("<br>", unsafe_allow_html=True)
-
-    if busca_atividade:
-        df_view = df[df['atividade'].str.contains(busca_atividade, case=False, na=False)]
+    modo_edicao = st.radio("Modo de edição", ["Cards", "Grade"], horizontal=True, label_visibility="collapsed")
+    if modo_edicao == "Grade":
+        render_grade(chave_df, lista_problemas)
     else:
-        df_view = df
-
-    if df_view.empty:
-        st.warning("Nenhuma atividade encontrada com este nome.")
-    else:
-        cols = st.columns(2)
-        
-        for i, (idx, row) in enumerate(df_view.iterrows()):
-            col_atual = cols[i % 2]
-            with st.container():
-                with col_atual:
-                    status_color = "#888" 
-                    if row['status'] == 'Concluido': status_color = "#4ADE80" 
-                    elif row['status'] == 'Nao Concluido': status_color = "#EF4444" 
-                    elif row['status'] == 'Em Andamento': status_color = "#E37026" 
-                    
-                    st.markdown(f"""
-                    <div class="task-card" style="border-left-color: {status_color};">
-                        <div class="card-sub-text">{row['local']}</div>
-                        <span class="status-badge" style="color:{status_color};  border: 1px solid {status_color};">{row['status']}</span>
-                        <div class="card-header-text">{row['atividade']}</div>
-                        <div style="font-size: 0.8rem; color: #ccc; margin-bottom: 10px;">
-                            {row['detalhe'] or ''} <span style="color: #666">|</span> {row['encarregado'] or 'S/ Equipe'}
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    opcoes_status = ["A Iniciar", "Em Andamento", "Concluido", "Nao Concluido"]
-                    idx_status = 0
-                    if row['status'] in opcoes_status:
-                        idx_status = opcoes_status.index(row['status'])
-                    
-                    new_status = st.selectbox(
-                        "Status", 
-                        opcoes_status,
-                        index=idx_status,
-                        key=f"st_{row['id']}",
-                        label_visibility="collapsed"
-                    )
-        
-                    selected_causa = row.get('causa') 
-                    
-                    if new_status == "Em Andamento":
-                        db_perc = row.get('percentual', 0)
-                        if pd.isna(db_perc): db_perc = 0
-
-                        st.number_input(
-                            "Conclusão (%):", 
-                            min_value=0, 
-                            max_value=100, 
-                            value=int(db_perc),
-                            step=5,
-                            key=f"perc_{row['id']}"
-                        )
-        
-                    if new_status in ["Nao Concluido", "Em Andamento"]:
-                        selected_causa = row.get('causa') 
-                        idx_causa = None
-
-                        if selected_causa and selected_causa in lista_problemas:
-                            idx_causa = lista_problemas.index(selected_causa)
-
-                        _causa_selecionada = st.selectbox(
-                            "Motivo / Problema:",
-                            lista_problemas,
-                            index=idx_causa,
-                            key=f"causa_{row['id']}",
-                            placeholder="Selecione o problema..."
-                        )
-        
-                    if new_status in ["Em Andamento", "Nao Concluido"]:
-                        db_obs = row.get('observacao', '')
-                        if pd.isna(db_obs): db_obs = ""
-
-                        _obs_digitada = st.text_area(
-                            "Observação:",
-                            value=db_obs,
-                            key=f"obs_{row['id']}",
-                            height=68,
-                            placeholder="Descreva detalhes..."
-                        )
-        
-                    st.markdown('<div style="margin: 5px 0;"></div>', unsafe_allow_html=True)
-                    
-                    d1, d2, d3, d4, d5 = st.columns(5)
-                    
-                    def day_widget(col_obj, label, db_val_rec, db_val_chk, suffix_id):
-                        with col_obj:
-                            is_disabled = (db_val_rec is None or str(db_val_rec).strip() == '')
-                            st.markdown(f"<div class='day-label'>{label}</div>", unsafe_allow_html=True)
-                            if not is_disabled:
-                                chk = st.checkbox("ok", value=db_val_chk, key=f"chk_{label}_{suffix_id}", label_visibility="collapsed")
-                                txt = st.text_area("r", value=db_val_rec, key=f"txt_{label}_{suffix_id}", label_visibility="collapsed", height=35)
-                                return chk, txt
-                            else:
-                                st.markdown("<div style='height: 28px; background: #222; border-radius: 4px; opacity: 0.3;'></div>", unsafe_allow_html=True)
-                                return False, None
-        
-                    chk_seg, txt_seg = day_widget(d1, "SEG", row['rec_seg'], row['feito_seg'], row['id'])
-                    chk_ter, txt_ter = day_widget(d2, "TER", row['rec_ter'], row['feito_ter'], row['id'])
-                    chk_qua, txt_qua = day_widget(d3, "QUA", row['rec_qua'], row['feito_qua'], row['id'])
-                    chk_qui, txt_qui = day_widget(d4, "QUI", row['rec_qui'], row['feito_qui'], row['id'])
-                    chk_sex, txt_sex = day_widget(d5, "SEX", row['rec_sex'], row['feito_sex'], row['id'])
-        
-                    st.markdown('<div style="margin-top: 5px; border-top: 1px solid #333; padding-top: 10px;">', unsafe_allow_html=True)
-                    
-                    c_btn1, c_btn2 = st.columns([2, 1])
-                    
-                    with c_btn1:
-                        if st.button("Salvar", key=f"save_{row['id']}", use_container_width=True):
-                            status_atual = st.session_state[f"st_{row['id']}"]
-                            up_data = {"status": status_atual}
-
-                            if txt_seg is not None: 
-                                up_data["rec_seg"] = txt_seg
-                                up_data["feito_seg"] = chk_seg
-                            if txt_ter is not None: 
-                                up_data["rec_ter"] = txt_ter
-                                up_data["feito_ter"] = chk_ter
-                            if txt_qua is not None: 
-                                up_data["rec_qua"] = txt_qua
-                                up_data["feito_qua"] = chk_qua
-                            if txt_qui is not None: 
-                                up_data["rec_qui"] = txt_qui
-                                up_data["feito_qui"] = chk_qui
-                            if txt_sex is not None: 
-                                up_data["rec_sex"] = txt_sex
-                                up_data["feito_sex"] = chk_sex
-        
-                            if status_atual in ["Nao Concluido", "Em Andamento"]:
-                                causa_val = st.session_state.get(f"causa_{row['id']}")
-                                up_data['causa'] = causa_val
-                            else:
-                                up_data['causa'] = None
-                            if status_atual == "Em Andamento":
-                                perc_val = st.session_state.get(f"perc_{row['id']}")
-                                up_data['percentual'] = perc_val
-                            elif status_atual == "Concluido":
-                                up_data['percentual'] = 100
-                            else:
-                                up_data['percentual'] = 0
-                            if status_atual in ["Em Andamento", "Nao Concluido"]:
-                                obs_val = st.session_state.get(f"obs_{row['id']}")
-                                up_data['observacao'] = obs_val
-                            else:
-                                up_data['observacao'] = None
-        
-                            try:
-                                supabase.table("pcp_programacao_semanal").update(up_data).eq("id", row['id']).execute()
-                                st.toast("Salvo!", icon="✅")
-                                time.sleep(0.5)
-
-
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Erro: {e}")
-        
-                    with c_btn2:
-                        if st.button("Editar", key=f"edit_{row['id']}", use_container_width=True):
-                            dialog_editar_atividade(row, lista_locais, lista_atividades)
+        render_cards(chave_df, df, lista_problemas, lista_locais, lista_atividades, kpi_slot)
 
     st.markdown("---")
     st.markdown("##### Fechamento da Semana")
@@ -515,57 +652,15 @@ def app(obra_id):
 
         if st.button("Confirmar Fechamento", type="primary", use_container_width=True):
             try:
-                data_ref_str = start_week.strftime('%Y-%m-%d')
-                mes_nome = get_month_name(start_week)
-                ano_val = start_week.year
-                semana_lbl = get_week_label(start_week)
-
-                supabase.table("pcp_historico_indicadores").delete()\
-                    .eq("obra_id", obra_id).eq("data_referencia", data_ref_str).execute()
-
-                supabase.table("pcp_historico_problemas").delete()\
-                    .eq("obra_id", obra_id).eq("data_referencia", data_ref_str).execute()
-
-                supabase.table("pcp_historico_indicadores").insert({
-                    "obra_id": obra_id,
-                    "mes": mes_nome,
-                    "ano": ano_val,
-                    "semana_ref": semana_lbl,
-                    "tipo_indicador": "PPC",
-                    "valor_percentual": ppc_percent,
-                    "meta_percentual": 80.0,
-                    "data_referencia": data_ref_str
-                }).execute()
-
-                supabase.table("pcp_historico_indicadores").insert({
-                    "obra_id": obra_id,
-                    "mes": mes_nome,
-                    "ano": ano_val,
-                    "semana_ref": semana_lbl,
-                    "tipo_indicador": "PAP",
-                    "valor_percentual": pap_percent,
-                    "meta_percentual": 80.0,
-                    "data_referencia": data_ref_str
-                }).execute()
-
-                causas_series = df[df['status'] == 'Nao Concluido']['causa'].value_counts()
-
-                if not causas_series.empty:
-                    lista_problemas_insert = []
-                    for causa, qtd in causas_series.items():
-                        if causa:
-                            lista_problemas_insert.append({
-                                "obra_id": obra_id,
-                                "mes": mes_nome,
-                                "ano": ano_val,
-                                "semana_ref": semana_lbl,
-                                "problema_descricao": causa,  
-                                "quantidade": int(qtd),
-                                "data_referencia": data_ref_str
-                            })
-
-                    if lista_problemas_insert:
-                        supabase.table("pcp_historico_problemas").insert(lista_problemas_insert).execute()
+                _, erros = frames.descarregar(supabase, chave_df)
+                if erros:
+                    raise RuntimeError("; ".join(erros))
+                df = frames.obter(chave_df)
+                render_kpis(kpi_slot, df)
+                cab = fechamento.cabecalho(obra_id, start_week.strftime('%Y-%m-%d'), get_month_name(start_week),
+                                           start_week.year, get_week_label(start_week))
+                snapshot = fechamento.snapshot_programacao(cab, df)
+                fechamento.fechar_semana(obra_id, cab["data_referencia"], supabase=supabase, **snapshot)
 
                 st.success("Semana finalizada com sucesso!")
                 st.balloons()
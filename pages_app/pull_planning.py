@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from modules import database
+from modules import frames
 from modules import ui
 import time
 
@@ -201,6 +202,24 @@ def render_pull_board(df):
     html.append('</div>') 
     st.markdown("".join(html), unsafe_allow_html=True)
 
+def chave_pull(obra_id):
+    return f"pull_{obra_id}"
+
+def carregar_pull(supabase, obra_id):
+    embed = frames.embed_locais(obra_id)
+    def preparar(df):
+        df = embed(df)
+        if df.empty:
+            return df
+        df['local_nome'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
+        df['local_ordem'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
+        return df
+    return frames.carregar(
+        chave_pull(obra_id),
+        lambda: supabase.table("pcp_pull_planning").select("*").eq("obra_id", obra_id).execute().data,
+        preparar,
+    )
+
 def render_management(supabase, obra_id):
     st.markdown("##### Gerenciar Pull Planning")
     
@@ -208,22 +227,17 @@ def render_management(supabase, obra_id):
     
     locais_disp = []
     try:
-        r = supabase.table("pcp_locais").select("nome").eq("obra_id", obra_id).order("ordem").execute()
-        locais_disp = [l['nome'] for l in r.data]
+        locais_disp = [l['nome'] for l in database.get_locais(obra_id)]
     except: pass
     
     filtro_local = c1.multiselect("Filtrar Local", locais_disp)
     
-    query = supabase.table("pcp_pull_planning").select("*, pcp_locais(nome, ordem)").eq("obra_id", obra_id)
-    
-    response = query.execute()
-    if not response.data:
+    df = carregar_pull(supabase, obra_id)
+    if df.empty:
         st.info("Nenhuma atividade encontrada.")
         return
 
-    df = pd.DataFrame(response.data)
-    df['local_nome'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
-    df['local_ordem'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
+    df = df.copy()
     df['semana_ref'] = df['semana_ref'].apply(safe_date)
     
     if filtro_local:
@@ -259,17 +273,20 @@ def render_management(supabase, obra_id):
             
             c_btn1, c_btn2 = c_ed.columns([1,1])
             if c_btn1.button("Salvar", key=f"sv_{row['id']}", type="primary", use_container_width=True):
-                supabase.table("pcp_pull_planning").update({
+                patch = frames.atualizar_alterados(chave_pull(obra_id), "pcp_pull_planning", row['id'], row, {
                     "semana_ref": str(new_week_date),
                     "status": new_status,
                     "responsavel": new_resp
-                }).eq("id", row['id']).execute()
-                st.toast("Salvo!")
-                time.sleep(0.5)
-                st.rerun()
+                }, supabase)
+                if patch:
+                    st.toast("Salvo!")
+                    time.sleep(0.5)
+                    st.rerun()
+                else:
+                    st.toast("Nenhuma alteração para salvar.")
                 
             if c_btn2.button("Excluir", key=f"dl_{row['id']}", use_container_width=True):
-                supabase.table("pcp_pull_planning").delete().eq("id", row['id']).execute()
+                frames.excluir(chave_pull(obra_id), "pcp_pull_planning", row['id'], supabase)
                 st.rerun()
 
 def app(obra_id):
@@ -294,8 +311,7 @@ def app(obra_id):
                 
                 atividades_padrao = []
                 try:
-                    r = supabase.table("pcp_atividades_padrao").select("atividade").execute()
-                    atividades_padrao = [a['atividade'] for a in r.data]
+                    atividades_padrao = [a['atividade'] for a in database.get_atividades_padrao()]
                 except: pass
                 
                 if usar_texto:
@@ -305,8 +321,7 @@ def app(obra_id):
                 
                 locais = []
                 try:
-                    r = supabase.table("pcp_locais").select("id, nome").eq("obra_id", obra_id).order("ordem").execute()
-                    locais = r.data
+                    locais = database.get_locais(obra_id)
                 except: pass
                 
                 c_1, c_2 = c_form.columns(2)
@@ -334,22 +349,18 @@ def app(obra_id):
                             "responsavel": resp_input,
                             "status": "Planejado"
                         }
-                        supabase.table("pcp_pull_planning").insert(payload).execute()
+                        frames.inserir(chave_pull(obra_id), "pcp_pull_planning", payload, supabase)
                         st.success("Post-it adicionado!")
                         time.sleep(0.5)
                         st.rerun()
 
         try:
-            response = supabase.table("pcp_pull_planning").select("*, pcp_locais(nome, ordem)").eq("obra_id", obra_id).execute()
+            df = carregar_pull(supabase, obra_id)
             
-            if not response.data:
+            if df.empty:
                 st.info("Mural vazio. Adicione post-its.")
             else:
-                df = pd.DataFrame(response.data)
-                df['local_nome'] = df['pcp_locais'].apply(lambda x: x['nome'] if x else "N/A")
-                df['local_ordem'] = df['pcp_locais'].apply(lambda x: x['ordem'] if x else 0)
-                
-                render_pull_board(df)
+                render_pull_board(df.copy())
                 
         except Exception as e:
             st.error(f"Erro ao carregar dados: {e}")
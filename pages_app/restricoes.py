@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from modules import database
+from modules import fechamento
+from modules import frames
 from modules import ui
 import time
 import math
@@ -102,7 +104,16 @@ def render_kpi_cards(df, start_week, end_week):
     st.markdown(html, unsafe_allow_html=True)
     return total_mes, count_resolvidas_semana, irr
 
-def render_boards(df, supabase):
+def chave_restricoes(obra_id):
+    return f"restricoes_{obra_id}"
+
+def carregar_restricoes(supabase, obra_id):
+    return frames.carregar(
+        chave_restricoes(obra_id),
+        lambda: supabase.table("pcp_restricoes").select("*").eq("obra_id", obra_id).order("id").execute().data,
+    )
+
+def render_boards(df, supabase, obra_id):
     st.markdown("""
     <style>
         .section-title {
@@ -201,10 +212,10 @@ def render_boards(df, supabase):
                     with c2:
                         st.markdown("<br>", unsafe_allow_html=True)
                         if st.button("Concluir", key=f"ok_{row['id']}", help="Marcar como Resolvido"):
-                            supabase.table("pcp_restricoes").update({
+                            frames.atualizar(chave_restricoes(obra_id), "pcp_restricoes", row['id'], {
                                 "status": "Removida",
                                 "data_resolucao": datetime.now().strftime('%Y-%m-%d')
-                            }).eq("id", row['id']).execute()
+                            }, supabase)
                             st.rerun()
 
         st.markdown('</div>', unsafe_allow_html=True)
@@ -247,11 +258,8 @@ def render_boards(df, supabase):
 def render_management(supabase, obra_id):
     st.markdown("##### Gerenciar Tudo")
     
-    query = supabase.table("pcp_restricoes").select("*").eq("obra_id", obra_id).order("id")
-    response = query.execute()
-    if not response.data: return
-    
-    df = pd.DataFrame(response.data)
+    df = carregar_restricoes(supabase, obra_id)
+    if df.empty: return
     
     for i, row in df.iterrows():
         status_txt = row.get('status', 'Pendente')
@@ -276,13 +284,15 @@ def render_management(supabase, obra_id):
                 if n_st == "Removida" and row['status'] == "Pendente":
                     upd["data_resolucao"] = datetime.now().strftime('%Y-%m-%d')
                 
-                supabase.table("pcp_restricoes").update(upd).eq("id", row['id']).execute()
-                st.toast("Atualizado!")
-                time.sleep(0.5)
-                st.rerun()
+                if frames.atualizar_alterados(chave_restricoes(obra_id), "pcp_restricoes", row['id'], row, upd, supabase):
+                    st.toast("Atualizado!")
+                    time.sleep(0.5)
+                    st.rerun()
+                else:
+                    st.toast("Nenhuma alteração para salvar.")
                 
             if c6.button("Excluir", key=f"del_{row['id']}", use_container_width=True):
-                supabase.table("pcp_restricoes").delete().eq("id", row['id']).execute()
+                frames.excluir(chave_restricoes(obra_id), "pcp_restricoes", row['id'], supabase)
                 st.rerun()
 
 def app(obra_id):
@@ -308,8 +318,9 @@ def app(obra_id):
     irr_val = 0
 
     try:
-        resp = supabase.table("pcp_restricoes").select("*").eq("obra_id", obra_id).execute()
-        df_all = pd.DataFrame(resp.data) if resp.data else pd.DataFrame(columns=['status', 'data_identificacao', 'data_resolucao'])
+        df_all = carregar_restricoes(supabase, obra_id)
+        if df_all.empty:
+            df_all = pd.DataFrame(columns=['status', 'data_identificacao', 'data_resolucao'])
         
         total_mes_val, removidas_sem_val, irr_val = render_kpi_cards(df_all, start_week, end_week)
     except:
@@ -347,7 +358,7 @@ def app(obra_id):
                             "status": "Pendente",
                             "data_identificacao": datetime.now().strftime('%Y-%m-%d')
                         }
-                        supabase.table("pcp_restricoes").insert(payload).execute()
+                        frames.inserir(chave_restricoes(obra_id), "pcp_restricoes", payload, supabase)
                         st.success("Adicionado!")
                         time.sleep(0.5)
                         st.rerun()
@@ -362,7 +373,7 @@ def app(obra_id):
                 )
                 df_filtrado = df_filtrado[mask]
             
-            render_boards(df_filtrado, supabase)
+            render_boards(df_filtrado, supabase, obra_id)
         else:
             st.info("Nenhuma restrição lançada.")
 
@@ -375,25 +386,10 @@ def app(obra_id):
         st.warning("Isso salvará o histórico de restrições para o Dashboard.")
         if st.button("Confirmar Fechamento", type="primary"):
             try:
-                
-                mes_nome = get_month_name(start_week)
-                ano_val = start_week.year
-                semana_label = get_week_label(start_week) 
-                supabase.table("pcp_historico_irr").delete().eq("obra_id", obra_id).eq("data_referencia", start_week.strftime('%Y-%m-%d')).execute()
-                
-                dados_irr = {
-                    "obra_id": obra_id,
-                    "mes": mes_nome,
-                    "ano": ano_val,
-                    "semana_ref": semana_label,
-                    "restricoes_totais": total_mes_val,
-                    "restricoes_removidas": removidas_sem_val,
-                    "irr_percentual": irr_val,
-                    "data_referencia": start_week.strftime('%Y-%m-%d'),
-                    "meta_percentual": 80.0
-                }
-                
-                supabase.table("pcp_historico_irr").insert(dados_irr).execute()
+                cab = fechamento.cabecalho(obra_id, start_week.strftime('%Y-%m-%d'), get_month_name(start_week),
+                                           start_week.year, get_week_label(start_week))
+                irr = fechamento.linha_irr(cab, total_mes_val, removidas_sem_val, irr_val)
+                fechamento.fechar_semana(obra_id, cab["data_referencia"], irr=[irr], supabase=supabase)
                 st.success("Dados salvos no histórico!")
                 st.balloons()
             except Exception as e:
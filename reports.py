@@ -0,0 +1,91 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from modules import relatorios
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data invalida: {valor} (use AAAA-MM-DD)")
+
+def cmd_weekly(args):
+    if args.data_fim < args.data_ini:
+        print("--to deve ser maior ou igual a --from", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.out, exist_ok=True)
+    semanas = relatorios.semanas_no_periodo(args.data_ini, args.data_fim)
+
+    inicio = time.perf_counter()
+    print(f"Carregando dados de {len(semanas)} semana(s)...")
+    periodo = relatorios.carregar_dados_periodo(semanas)
+    if not args.incluir_vazias:
+        periodo = [d for d in periodo if d["programacao"]]
+    print(f"Dados carregados em {time.perf_counter() - inicio:.1f}s; gerando {len(periodo)} relatorio(s).")
+
+    falhas = 0
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=ctx) as executor:
+        futures = {
+            executor.submit(
+                relatorios.salvar_pdf_semanal, dados,
+                os.path.join(args.out, f"relatorio_obras_{dados['data_ref']}.pdf"),
+                args.perfil,
+            ): dados["data_ref"]
+            for dados in periodo
+        }
+        for fut in as_completed(futures):
+            semana = futures[fut]
+            try:
+                print(f"  {semana}: {fut.result()}")
+            except Exception as e:
+                falhas += 1
+                print(f"  {semana}: ERRO {e}", file=sys.stderr)
+
+    print(f"Concluido em {time.perf_counter() - inicio:.1f}s ({falhas} falha(s)).")
+    return 1 if falhas else 0
+
+def cmd_consolidated(args):
+    if args.data_fim < args.data_ini:
+        print("--to deve ser maior ou igual a --from", file=sys.stderr)
+        return 2
+
+    semanas = relatorios.semanas_no_periodo(args.data_ini, args.data_fim)
+    destino = args.out or f"relatorio_obras_{semanas[0]}_{semanas[-1]}.pdf"
+
+    inicio = time.perf_counter()
+    relatorios.escrever_pdf_streaming(semanas[0], semanas[-1], destino, perfil_imagem=args.perfil)
+    print(f"{destino} gerado em {time.perf_counter() - inicio:.1f}s (pico RSS {relatorios.pico_rss_mb()} MB).")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m reports", description="Geracao de relatorios sem a interface Streamlit.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    weekly = sub.add_parser("weekly", help="Relatorios semanais de um intervalo de datas")
+    weekly.add_argument("--from", dest="data_ini", type=_data, required=True, help="Data inicial (AAAA-MM-DD)")
+    weekly.add_argument("--to", dest="data_fim", type=_data, required=True, help="Data final (AAAA-MM-DD)")
+    weekly.add_argument("--out", required=True, help="Diretorio de saida")
+    weekly.add_argument("--perfil", default=relatorios.PERFIL_IMAGEM_PADRAO, choices=sorted(relatorios.PERFIS_IMAGEM), help="Perfil de imagem dos graficos")
+    weekly.add_argument("--workers", type=int, default=relatorios.RELATORIO_WORKERS, help="Semanas renderizadas em paralelo")
+    weekly.add_argument("--incluir-vazias", action="store_true", help="Gera PDF tambem para semanas sem programacao")
+    weekly.set_defaults(func=cmd_weekly)
+
+    consolidated = sub.add_parser("consolidated", help="Relatorio consolidado de um periodo (modo streaming, memoria limitada)")
+    consolidated.add_argument("--from", dest="data_ini", type=_data, required=True, help="Data inicial (AAAA-MM-DD)")
+    consolidated.add_argument("--to", dest="data_fim", type=_data, required=True, help="Data final (AAAA-MM-DD)")
+    consolidated.add_argument("--out", help="Arquivo PDF de saida")
+    consolidated.add_argument("--perfil", default="leve", choices=sorted(relatorios.PERFIS_IMAGEM), help="Perfil de imagem dos graficos")
+    consolidated.set_defaults(func=cmd_consolidated)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+-- "Salvar tudo" da grade da Programacao Semanal (chamado via supabase.rpc("pcp_atualizar_programacao", ...)).
+-- p_linhas: [{"id": 1, "campos": {"status": "Concluido", "feito_seg": true}}, ...]
+-- So UPDATE: uma linha apagada por outro usuario nao volta, e cada linha recebe apenas os proprios
+-- campos (jsonb_populate_record parte da linha atual e sobrescreve so as chaves presentes em campos).
+-- Devolve as linhas atualizadas para o app aplicar no frame em memoria.
+create or replace function public.pcp_atualizar_programacao(
+    p_linhas jsonb
+) returns setof public.pcp_programacao_semanal
+language sql
+as $$
+    update public.pcp_programacao_semanal t
+       set (local, atividade, detalhe, encarregado, status, percentual, causa, observacao,
+            rec_seg, feito_seg, rec_ter, feito_ter, rec_qua, feito_qua,
+            rec_qui, feito_qui, rec_sex, feito_sex) =
+           (select r.local, r.atividade, r.detalhe, r.encarregado, r.status, r.percentual, r.causa, r.observacao,
+                   r.rec_seg, r.feito_seg, r.rec_ter, r.feito_ter, r.rec_qua, r.feito_qua,
+                   r.rec_qui, r.feito_qui, r.rec_sex, r.feito_sex
+              from jsonb_populate_record(t, l.campos) r)
+      from jsonb_to_recordset(p_linhas) as l(id bigint, campos jsonb)
+     where t.id = l.id
+    returning t.*;
+$$;
+
+-- PostgREST so enxerga a funcao nova depois de recarregar o schema
+notify pgrst, 'reload schema';
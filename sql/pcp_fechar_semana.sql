@@ -0,0 +1,47 @@
+-- Fechamento da semana numa unica transacao (chamado via supabase.rpc("pcp_fechar_semana", ...)).
+-- Cada bloco so e tocado quando o parametro vem preenchido: a Programacao Semanal envia
+-- indicadores + problemas e a tela de Restricoes envia so o IRR. Um array vazio apaga o bloco.
+create or replace function public.pcp_fechar_semana(
+    p_obra_id bigint,
+    p_data_referencia date,
+    p_indicadores jsonb default null,
+    p_problemas jsonb default null,
+    p_irr jsonb default null
+) returns void
+language plpgsql
+as $$
+begin
+    if p_indicadores is not null then
+        delete from public.pcp_historico_indicadores
+         where obra_id = p_obra_id and data_referencia = p_data_referencia;
+
+        insert into public.pcp_historico_indicadores
+            (obra_id, mes, ano, semana_ref, tipo_indicador, valor_percentual, meta_percentual, data_referencia)
+        select p_obra_id, r.mes, r.ano, r.semana_ref, r.tipo_indicador, r.valor_percentual, r.meta_percentual, p_data_referencia
+          from jsonb_populate_recordset(null::public.pcp_historico_indicadores, p_indicadores) r;
+    end if;
+
+    if p_problemas is not null then
+        delete from public.pcp_historico_problemas
+         where obra_id = p_obra_id and data_referencia = p_data_referencia;
+
+        insert into public.pcp_historico_problemas
+            (obra_id, mes, ano, semana_ref, problema_descricao, quantidade, data_referencia)
+        select p_obra_id, r.mes, r.ano, r.semana_ref, r.problema_descricao, r.quantidade, p_data_referencia
+          from jsonb_populate_recordset(null::public.pcp_historico_problemas, p_problemas) r;
+    end if;
+
+    if p_irr is not null then
+        delete from public.pcp_historico_irr
+         where obra_id = p_obra_id and data_referencia = p_data_referencia;
+
+        insert into public.pcp_historico_irr
+            (obra_id, mes, ano, semana_ref, restricoes_totais, restricoes_removidas, irr_percentual, meta_percentual, data_referencia)
+        select p_obra_id, r.mes, r.ano, r.semana_ref, r.restricoes_totais, r.restricoes_removidas, r.irr_percentual, r.meta_percentual, p_data_referencia
+          from jsonb_populate_recordset(null::public.pcp_historico_irr, p_irr) r;
+    end if;
+end;
+$$;
+
+-- PostgREST so enxerga a funcao nova depois de recarregar o schema
+notify pgrst, 'reload schema';
@@ -0,0 +1,13 @@
+-- Atividades do LOB com a ordem do pavimento, para a paginacao do "Gerenciar Atividades"
+-- (pages_app/lob.py). Permite keyset em (ordem_pav, data_ordem, id) numa unica consulta:
+-- atividades sem local vem primeiro e as sem data de inicio vem por ultimo dentro do pavimento.
+create or replace view public.pcp_lob_atividades_ordenadas
+with (security_invoker = true) as
+select a.*,
+       coalesce(l.ordem, -2147483648) as ordem_pav,
+       coalesce(a.data_inicio, 'infinity'::date) as data_ordem
+  from public.pcp_lob_atividades a
+  left join public.pcp_locais l on l.id = a.local_id;
+
+-- PostgREST so enxerga a view nova depois de recarregar o schema
+notify pgrst, 'reload schema';
@@ -0,0 +1,53 @@
+-- Versao barata dos dados do relatorio semanal, usada como chave do cache de PDFs
+-- (chamado via supabase.rpc("pcp_versao_relatorio_semanal", ...)).
+-- Contagem + maior id + ultimo atualizado_em por tabela: insercao, exclusao ou edicao mudam o resultado
+-- sem que o app precise baixar as linhas.
+
+-- atualizado_em mantido por trigger em toda escrita
+alter table public.pcp_programacao_semanal add column if not exists atualizado_em timestamptz not null default now();
+alter table public.pcp_restricoes add column if not exists atualizado_em timestamptz not null default now();
+alter table public.pcp_obras add column if not exists atualizado_em timestamptz not null default now();
+
+create or replace function public.pcp_marcar_atualizado() returns trigger
+language plpgsql
+as $$
+begin
+    new.atualizado_em := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists pcp_programacao_semanal_atualizado on public.pcp_programacao_semanal;
+create trigger pcp_programacao_semanal_atualizado before update on public.pcp_programacao_semanal
+    for each row execute function public.pcp_marcar_atualizado();
+
+drop trigger if exists pcp_restricoes_atualizado on public.pcp_restricoes;
+create trigger pcp_restricoes_atualizado before update on public.pcp_restricoes
+    for each row execute function public.pcp_marcar_atualizado();
+
+drop trigger if exists pcp_obras_atualizado on public.pcp_obras;
+create trigger pcp_obras_atualizado before update on public.pcp_obras
+    for each row execute function public.pcp_marcar_atualizado();
+
+create or replace function public.pcp_versao_relatorio_semanal(
+    p_data_referencia date
+) returns jsonb
+language sql
+stable
+as $$
+    with prog as (
+        select id, obra_id, atualizado_em
+          from public.pcp_programacao_semanal
+         where data_inicio_semana = p_data_referencia
+    )
+    select jsonb_build_object(
+        'programacao', (select jsonb_build_array(count(*), max(id), max(atualizado_em)) from prog),
+        'restricoes', (select jsonb_build_array(count(*), max(r.id), max(r.atualizado_em))
+                         from public.pcp_restricoes r
+                        where r.obra_id in (select obra_id from prog)),
+        'obras', (select jsonb_build_array(count(*), max(id), max(atualizado_em)) from public.pcp_obras)
+    );
+$$;
+
+-- PostgREST so enxerga a funcao nova depois de recarregar o schema
+notify pgrst, 'reload schema';
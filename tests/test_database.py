@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+from postgrest import SyncPostgrestClient
+from postgrest._sync.request_builder import SyncQueryRequestBuilder, SyncSingleRequestBuilder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+
+@pytest.fixture
+def execucoes(monkeypatch):
+    # Sem servidor: cada execute() devolve um objeto novo e fica registrado
+    monkeypatch.setattr(database.st, "session_state", {})
+    chamadas = []
+
+    def executar(self):
+        chamadas.append(str(self.request.path))
+        return object()
+
+    monkeypatch.setattr(SyncQueryRequestBuilder, "execute", executar)
+    monkeypatch.setattr(SyncSingleRequestBuilder, "execute", executar)
+    database.begin_run()
+    return chamadas
+
+@pytest.fixture
+def cliente():
+    return SyncPostgrestClient("http://localhost/rest/v1")
+
+def test_selects_iguais_executam_uma_vez(execucoes, cliente):
+    r1 = database.run_query(cliente.from_("pcp_obras").select("id, nome").eq("id", 1))
+    r2 = database.run_query(cliente.from_("pcp_obras").select("id, nome").eq("id", 1))
+    assert r1 is r2
+    assert len(execucoes) == 1
+    assert database.get_query_memo_hits() == 1
+
+def test_contador_de_hits_por_rerun_e_por_sessao(execucoes, cliente):
+    for _ in range(3):
+        database.run_query(cliente.from_("pcp_obras").select("id"))
+    database.begin_run()
+    database.run_query(cliente.from_("pcp_obras").select("id"))
+    database.run_query(cliente.from_("pcp_obras").select("id"))
+    assert database.get_query_memo_hits() == 1
+    assert database.get_query_memo_hits(total=True) == 3
+
+def test_selects_diferentes_nao_compartilham_resultado(execucoes, cliente):
+    r1 = database.run_query(cliente.from_("pcp_obras").select("id, nome"))
+    r2 = database.run_query(cliente.from_("pcp_locais").select("id, nome"))
+    r3 = database.run_query(cliente.from_("pcp_obras").select("id, nome").eq("id", 1))
+    r4 = database.run_query(cliente.from_("pcp_obras").select("id, nome").eq("id", 1).single())
+    assert len({id(r) for r in (r1, r2, r3, r4)}) == 4
+    assert len(execucoes) == 4
+
+def test_escrita_limpa_o_memo(execucoes, cliente):
+    database.run_query(cliente.from_("pcp_obras").select("id"))
+    database.run_query(cliente.from_("pcp_obras").update({"nome": "x"}).eq("id", 1))
+    database.run_query(cliente.from_("pcp_obras").select("id"))
+    assert len(execucoes) == 3
+
+def test_run_concurrently_usa_o_memo_da_rerun(execucoes, cliente):
+    r1 = database.run_query(cliente.from_("pcp_obras").select("id, nome"))
+    resultados, erros = database.run_concurrently({
+        "obras": cliente.from_("pcp_obras").select("id, nome"),
+        "locais": cliente.from_("pcp_locais").select("id, nome"),
+    })
+    assert not erros
+    assert resultados["obras"] is r1
+    assert resultados["locais"] is not r1
+    assert database.get_query_memo_hits() == 1
+    assert execucoes == ["http://localhost/rest/v1/pcp_obras", "http://localhost/rest/v1/pcp_locais"]